@@ -0,0 +1,236 @@
+"""
+Benchmarks on generated stress boards.
+
+    python benchmark.py --ticks 100 --sizes 16 32 64 --out bench.json
+    python benchmark.py --render --zooms 8 16 32 64
+
+Every board is built from its size alone, so runs are comparable between
+versions. Each one is ticked through Engine on an unbounded grid, and
+reported as JSON: ticks per second, peak memory, and the Vectors and Cells
+made per tick. The timed run and the measured run are separate, since
+tracing memory slows ticks down a lot.
+
+--render times draw_grid and draw_cells instead, at each camera zoom,
+without a window unless SDL_VIDEODRIVER says otherwise.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from cells import Grid, Cell, Vector, UNBOUNDED, Wall, Mover, Generator, RotatorCW, Push, Enemy, Trash
+from engine import Engine
+
+RIGHT, DOWN, LEFT, UP = range(4) # as Cell.dir
+
+def cell(cell_class, x, y, dir = RIGHT):
+    return {"type": Cell.subclasses.index(cell_class), "x": x, "y": y, "dir": dir}
+
+# Boards, as Grid.save_state lists. size is roughly the side of the square they fill.
+def mover_trains(size):
+    # Every other row: a few movers pushing a Push chain twice as long
+    state = []
+    for y in range(0, size, 2):
+        movers = max(1, size // 8)
+        state += [cell(Mover, x, y) for x in range(movers)]
+        state += [cell(Push, x, y) for x in range(movers, movers + size // 4)]
+    return state
+
+def generator_farms(size):
+    # Every other row: a generator copying a Push into a line that ends in Trash
+    state = []
+    for y in range(0, size, 2):
+        state += [cell(Push, 0, y), cell(Generator, 1, y), cell(Trash, size - 1, y)]
+    return state
+
+def rotator_checkerboard(size):
+    # Rotators on one colour, movers and pushes on the other, turning every tick
+    state = []
+    for y in range(size):
+        for x in range(size):
+            if (x + y) % 2 == 0:
+                state.append(cell(RotatorCW, x, y))
+            else:
+                state.append(cell(Mover if x % 4 == 1 else Push, x, y, (x // 2 + y) % 4))
+    return state
+
+def enemy_fields(size):
+    # A block of enemies, worn down by generated pushes from one side and
+    # mover trains from the other
+    state = []
+    for y in range(size):
+        state += [cell(Push, 0, y), cell(Generator, 1, y)]
+        state += [cell(Enemy, x, y) for x in range(size // 2, size)]
+        if y % 2:
+            state += [cell(Mover, x, y, LEFT) for x in range(size + 2, size + 2 + max(1, size // 8))]
+    return state
+
+def wall_maze(size, seed = 0):
+    # Mostly walls that never move, with a few rotators turning a push and
+    # the walls next to them
+    rng = random.Random(seed)
+    state = []
+    taken = set()
+    for y in range(0, size, 2):
+        for x in range(size):
+            if rng.random() < 0.8:
+                state.append(cell(Wall, x, y))
+                taken.add((x, y))
+        if y + 1 < size:
+            x = rng.randrange(size)
+            state.append(cell(Wall, x, y + 1))
+            taken.add((x, y + 1))
+    for _ in range(max(1, size // 8)):
+        x, y = rng.randrange(size - 1), rng.randrange(1, size, 2)
+        if (x, y) in taken or (x + 1, y) in taken: continue
+        state += [cell(RotatorCW, x, y), cell(Push, x + 1, y)]
+        taken.update(((x, y), (x + 1, y)))
+    return state
+
+BOARDS = {
+    "mover_trains": mover_trains,
+    "generator_farms": generator_farms,
+    "rotator_checkerboard": rotator_checkerboard,
+    "enemy_fields": enemy_fields,
+    "wall_maze": wall_maze,
+}
+
+class AllocationCounter:
+    # Counts the Vectors and Cells made while in a with block, by wrapping
+    # their constructors. Cells reused from Cell.free do not count.
+    def __enter__(self):
+        self.vectors = self.cells = 0
+        self.vector_init = Vector.__init__
+        self.cell_new = Cell.__dict__["__new__"]
+        vector_init, cell_new = self.vector_init, self.cell_new.__func__
+
+        def count_vector(vector, x, y):
+            self.vectors += 1
+            vector_init(vector, x, y)
+        def count_cell(cls, *args, **kwargs):
+            if not Cell.free.get(cls):
+                self.cells += 1
+            return cell_new(cls, *args, **kwargs)
+
+        Vector.__init__ = count_vector
+        Cell.__new__ = staticmethod(count_cell)
+        return self
+
+    def __exit__(self, *exc):
+        Vector.__init__ = self.vector_init
+        Cell.__new__ = self.cell_new
+
+def load(board, size, chunked):
+    Grid.range = UNBOUNDED
+    Grid.set_chunked(False)
+    Grid.load_state(BOARDS[board](size))
+    Grid.set_chunked(chunked)
+    return Engine()
+
+def measure(board, size, ticks, chunked = False):
+    engine = load(board, size, chunked)
+    cells = len(Grid.cells)
+    start = time.perf_counter()
+    engine.step(ticks)
+    elapsed = time.perf_counter() - start
+
+    # Same again, traced. Peak memory includes the board itself.
+    tracemalloc.start()
+    engine = load(board, size, chunked)
+    with AllocationCounter() as allocations:
+        engine.step(ticks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "board": board,
+        "size": size,
+        "chunked": chunked,
+        "cells": cells,
+        "final_cells": len(Grid.cells),
+        "ticks": ticks,
+        "seconds": elapsed,
+        "ticks_per_second": ticks / elapsed if elapsed > 0 else None,
+        "peak_memory_bytes": peak,
+        "vectors_per_tick": allocations.vectors / ticks,
+        "cells_per_tick": allocations.cells / ticks,
+    }
+
+def measure_render(zooms, frames, board = "rotator_checkerboard", size = 64, screen_size = (800, 500)):
+    # Frames per second of draw_grid and draw_cells at each zoom, with the
+    # camera on the middle of the board and cells animating between ticks
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from cells import TICK_RATE
+    from render import load_textures, SpriteCache, draw_grid, draw_cells
+
+    pygame.init()
+    screen = pygame.display.set_mode(screen_size)
+    sprites = SpriteCache(load_textures(os.path.join(os.path.dirname(os.path.abspath(__file__)), "textures")))
+    camera_pos = (size / 2, size / 2)
+    frame_time = 1 / 60
+
+    results = []
+    for zoom in zooms:
+        engine = load(board, size, False)
+        sprites.set_zoom(zoom)
+        drawing = 0.0
+        for frame in range(frames):
+            # A tick every few frames, like main.py at its normal speed
+            if frame % round(1 / (frame_time * TICK_RATE)) == 0:
+                engine.step()
+            for c in Grid.cells:
+                c.update_animation(frame_time)
+
+            start = time.perf_counter()
+            screen.fill((0, 0, 0))
+            draw_grid(screen, sprites, camera_pos, zoom)
+            draw_cells(screen, sprites, camera_pos, zoom)
+            pygame.display.flip()
+            drawing += time.perf_counter() - start
+
+        results.append({
+            "board": board,
+            "size": size,
+            "zoom": zoom,
+            "frames": frames,
+            "seconds": drawing,
+            "frames_per_second": frames / drawing if drawing > 0 else None,
+        })
+    pygame.quit()
+    return results
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark Pyxell on generated boards")
+    parser.add_argument("-b", "--boards", nargs = "+", choices = list(BOARDS), default = list(BOARDS))
+    parser.add_argument("-s", "--sizes", nargs = "+", type = int, default = [16, 32, 64])
+    parser.add_argument("-n", "--ticks", type = int, default = 50)
+    parser.add_argument("--chunked", action = "store_true", help = "tick with Grid.set_chunked(True)")
+    parser.add_argument("--render", action = "store_true", help = "time the draw code instead of ticks")
+    parser.add_argument("--zooms", nargs = "+", type = int, default = [8, 16, 32, 64])
+    parser.add_argument("--frames", type = int, default = 120)
+    parser.add_argument("-o", "--out", help = "where to write the results (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.render:
+        results = {"render": measure_render(args.zooms, args.frames)}
+    else:
+        results = {"boards": [
+            measure(board, size, args.ticks, args.chunked)
+            for board in args.boards for size in args.sizes
+        ]}
+    results["python"] = sys.version.split()[0]
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent = 1)
+    else:
+        json.dump(results, sys.stdout, indent = 1)
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
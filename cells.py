@@ -0,0 +1,871 @@
+"""
+Simulation model: vectors, the grid and every cell type.
+Nothing in here touches pygame, so it can run without a display.
+"""
+
+import itertools
+from array import array
+from bisect import bisect_left, insort
+
+# Vector class. A vector is never changed once made, so one can be shared
+# freely, like ZERO and the directions below.
+class Vector:
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __add__(self, other):
+        return Vector(self.x + other.x, self.y + other.y)
+    
+    def __sub__(self, other):
+        return Vector(self.x - other.x, self.y - other.y)
+    
+    def __mul__(self, other):
+        return Vector(self.x * other, self.y * other)
+    
+    def __pow__(self, other):
+        return Vector(self.x * other.x, self.y * other.y)
+    
+    def rotcw(self):
+        return Vector(-self.y, self.x)
+    
+    def rotccw(self):
+        return Vector(self.y, -self.x)  
+    
+    def rot180(self):
+        return Vector(-self.x, -self.y)
+    
+    def tuple(self):
+        return (self.x, self.y)
+
+    def __getitem__(self, index):
+        # Lets a vector unpack like a tuple, without making one
+        if index == 0: return self.x
+        if index == 1: return self.y
+        raise IndexError(index)
+
+    def __str__(self):
+        return f"<X: {self.x}, Y: {self.y}>"
+    
+    def __eq__(self, other):
+        if not isinstance(other, Vector):
+            return NotImplemented
+        return self.x == other.x and self.y == other.y
+    
+    def __class_getitem__(cls, _):
+        return cls
+
+# Sample vectors
+ZERO = Vector(0, 0)
+UP = Vector(0, -1)
+DOWN = Vector(0, 1)
+LEFT = Vector(-1, 0)
+RIGHT = Vector(1, 0)
+
+# Cell.dir is an index into DIRECTIONS, the same number saved states use.
+# Adding 1 turns clockwise, 3 counter-clockwise and 2 around.
+DIRECTIONS = [RIGHT, DOWN, LEFT, UP]
+DIR_ANGLES = [0, 270, 180, 90] # texture rotation in degrees for each dir
+
+# The grid range of a world with no edges
+UNBOUNDED = ((None, None), (None, None))
+
+# Tile (x, y) is in chunk (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT), so chunks are 16 x 16
+CHUNK_SHIFT = 4
+
+# Saved states packed as (type, x, y, dir) per cell in an int array
+def pack_state(state):
+    packed = array("i")
+    for item in state:
+        packed.extend((item["type"], item["x"], item["y"], item["dir"]))
+    return packed.tobytes()
+
+def unpack_state(packed):
+    values = array("i")
+    values.frombytes(packed)
+    return [
+        {"type": values[i], "x": values[i + 1], "y": values[i + 2], "dir": values[i + 3]}
+        for i in range(0, len(values), 4)
+    ]
+
+# Grid class (immutable)
+class Grid:
+    range = ((-50, 50), (-50, 50))
+    cells = []
+    index = {} # (x, y) -> cell, kept in sync with cells
+    touched = {} # cell -> Grid.cell_key before it was first touched since the last tick
+    journals = [] # open journals, each like touched but since the journal was opened
+    state_stack = [] # journals opened by push_state
+    undo_stack = [] # journals of finished edits, newest last
+    redo_stack = []
+    undo_limit = 100
+    debug = False
+    animate = True # False skips per-tick animation state, e.g. when fast-forwarding
+
+    # Chunk tracking, see Grid.set_chunked. Chunks hold the cells in the index,
+    # and only chunks near a change are ticked (see Engine.tick).
+    chunked = False
+    chunks = {} # (cx, cy) -> set of cells, only for chunks that have any
+    woken = set() # chunks to tick next, filled by Grid.wake
+    dead = None # while Engine ticks, cells made and destroyed during the tick, see Grid.recycle
+    walked = set() # (x, y) tiles and (x, y, dx, dy) runs Grid.wake already did since it was last cleared
+
+    def getCellAt(pos):
+        return Grid.index.get((pos.x, pos.y))
+
+    def isInBounds(point):
+        x, y = point
+        (xmin, xmax), (ymin, ymax) = Grid.range
+        return (
+            (xmin is None or x >= xmin) and
+            (xmax is None or x <= xmax) and
+            (ymin is None or y >= ymin) and
+            (ymax is None or y <= ymax)
+        )
+    
+    def cells_in(xmin, xmax, ymin, ymax):
+        # Cells on the tiles of a rectangle (bounds inclusive). Probes the index
+        # when the rectangle is small, otherwise filters the cell list.
+        if Grid.chunked:
+            return Grid.chunk_cells_in(xmin, xmax, ymin, ymax)
+        if (xmax - xmin + 1) * (ymax - ymin + 1) < len(Grid.index):
+            index = Grid.index
+            return [
+                cell for x in range(xmin, xmax + 1) for y in range(ymin, ymax + 1)
+                if (cell := index.get((x, y))) is not None
+            ]
+        return [c for c in Grid.index.values() if xmin <= c.pos.x <= xmax and ymin <= c.pos.y <= ymax]
+
+    def chunk_cells_in(xmin, xmax, ymin, ymax):
+        # cells_in, looking only at the chunks that overlap the rectangle
+        s = CHUNK_SHIFT
+        cxmin, cxmax, cymin, cymax = xmin >> s, xmax >> s, ymin >> s, ymax >> s
+        if (cxmax - cxmin + 1) * (cymax - cymin + 1) < len(Grid.chunks):
+            chunks = [
+                cells for cx in range(cxmin, cxmax + 1) for cy in range(cymin, cymax + 1)
+                if (cells := Grid.chunks.get((cx, cy))) is not None
+            ]
+        else:
+            chunks = [
+                cells for (cx, cy), cells in Grid.chunks.items()
+                if cxmin <= cx <= cxmax and cymin <= cy <= cymax
+            ]
+        return [c for cells in chunks for c in cells if xmin <= c.pos.x <= xmax and ymin <= c.pos.y <= ymax]
+
+    def set_chunked(chunked):
+        # Chunk tracking costs a little on every move, but lets Engine skip
+        # whole areas where nothing is happening. Worth it for big, sparse or
+        # unbounded worlds.
+        Grid.chunked = chunked
+        Grid.chunks = {}
+        if chunked:
+            s = CHUNK_SHIFT
+            for (x, y), c in Grid.index.items():
+                Grid.chunks.setdefault((x >> s, y >> s), set()).add(c)
+        Grid.woken = set(Grid.chunks)
+        Grid.walked = set()
+        # Schedule buckets are split by chunk too
+        Schedule.clear()
+        Schedule.add_all(Grid.cells)
+
+    def chunk_of(pos):
+        return (pos.x >> CHUNK_SHIFT, pos.y >> CHUNK_SHIFT) if Grid.chunked else None
+
+    def wake(x, y):
+        # Tile (x, y) just changed, so wake the chunks of every cell that might
+        # act differently now: its neighbours, and any cell in a run of cells
+        # leading up to it from one side, which could be pushing into it.
+        # Tiles and runs already walked were either unchanged since, or
+        # whatever joined them woke the run behind itself.
+        walked = Grid.walked
+        if (x, y) in walked: return
+        walked.add((x, y))
+        s = CHUNK_SHIFT
+        index, woken = Grid.index, Grid.woken
+        woken.update((
+            (x >> s, y >> s), ((x + 1) >> s, y >> s), ((x - 1) >> s, y >> s),
+            (x >> s, (y + 1) >> s), (x >> s, (y - 1) >> s)
+        ))
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            px, py = x - dx, y - dy
+            while (px, py) in index:
+                run = (px, py, dx, dy)
+                if run in walked: break
+                walked.add(run)
+                woken.add((px >> s, py >> s))
+                px -= dx
+                py -= dy
+
+    def index_cell(cell):
+        # Puts a cell in the index, unless its tile already has one
+        key = (cell.pos.x, cell.pos.y)
+        if Grid.index.setdefault(key, cell) is not cell: return
+        if Grid.chunked:
+            s = CHUNK_SHIFT
+            Grid.chunks.setdefault((key[0] >> s, key[1] >> s), set()).add(cell)
+            Grid.wake(*key)
+
+    def unindex_cell(cell):
+        # Takes a cell out of the index, if it is the one there. Empty chunks are freed.
+        key = (cell.pos.x, cell.pos.y)
+        if Grid.index.get(key) is not cell: return
+        del Grid.index[key]
+        if Grid.chunked:
+            s = CHUNK_SHIFT
+            chunk = (key[0] >> s, key[1] >> s)
+            cells = Grid.chunks[chunk]
+            cells.discard(cell)
+            if not cells:
+                del Grid.chunks[chunk]
+            Grid.wake(*key)
+
+    def recycle():
+        # Nothing refers to the cells in Grid.dead once the tick is over, so
+        # new cells can reuse them (a blocked generator makes one every tick)
+        for c in Grid.dead:
+            free = Cell.free.setdefault(c.__class__, [])
+            if len(free) < Cell.free_limit:
+                free.append(c)
+        Grid.dead = None
+
+    def finish_animations():
+        # Show every cell where it is now
+        for c in Grid.cells:
+            c.anim_from = c.anim_to = c.pos
+            c.anim_t = 1.0
+            c.render_rot = c.target_rot
+
+    def clear_all():
+        for c in Grid.cells:
+            Grid.touch(c)
+            c.alive = False
+        Grid.cells.clear()
+        Grid.index.clear()
+        Grid.chunks.clear()
+        Schedule.clear()
+
+    def move_cell(cell, new):
+        Grid.unindex_cell(cell)
+        # Destroyed cells can still finish their move this tick, but stay off the grid
+        if cell.alive:
+            Grid.touch(cell)
+            Schedule.remove(cell)
+            cell.pos = new
+            Grid.index_cell(cell)
+            Schedule.add(cell)
+        else:
+            cell.pos = new
+
+    def cell_key(cell):
+        return (cell.pos.x, cell.pos.y, cell.dir) if cell.alive else None
+
+    def touch(cell):
+        if cell not in Grid.touched:
+            Grid.touched[cell] = Grid.cell_key(cell)
+        for journal in Grid.journals:
+            if cell not in journal:
+                journal[cell] = Grid.cell_key(cell)
+
+    def changed(touched):
+        # Whether any touched cell ended up different from how it started
+        return any(before != Grid.cell_key(c) for c, before in touched.items())
+
+    def resolve_push(cell, force, pusher = None):
+        # cell.apply_force(force, pusher): walk the line in front once, decide
+        # what happens to all of it, then commit front first without recursion
+        reaction = cell.push_reaction(force)
+        if reaction == BLOCKS:
+            return
+        if reaction != GIVES_WAY:
+            if pusher is not None:
+                pusher.destroy()
+                if reaction == EXPLODES: cell.destroy()
+            return
+        if force == ZERO: return
+
+        # The whole run up to the first empty tile has to fit inside the grid
+        line = [cell]
+        pos = cell.pos + force
+        while (next_cell := Grid.getCellAt(pos)) is not None:
+            line.append(next_cell)
+            pos = pos + force
+        if not Grid.isInBounds(pos): return
+
+        # Every cell before the first one that does not give way gets moved
+        end = 1
+        while end < len(line) and line[end].push_reaction(force) == GIVES_WAY:
+            end += 1
+        moving = line[:end]
+        for c in moving:
+            c.vel = ZERO
+            c.finish_animation()
+
+        if end < len(line):
+            front = line[end]
+            reaction = front.push_reaction(force)
+            if reaction == BLOCKS: return
+            last = moving.pop()
+            last.destroy()
+            if reaction == EXPLODES:
+                front.destroy()
+                # Already destroyed, but it still finishes its step
+                last.relocate(last.pos + force)
+
+        for c in reversed(moving):
+            c.relocate(c.pos + force)
+
+    def check_index():
+        # Debug only: rebuild the index from scratch and compare
+        expected = {}
+        for c in Grid.cells:
+            expected.setdefault((c.pos.x, c.pos.y), c)
+        if expected != Grid.index:
+            raise RuntimeError("Grid index out of sync with Grid.cells")
+        if Grid.chunked:
+            chunks = {}
+            for c in Grid.index.values():
+                chunks.setdefault(Grid.chunk_of(c.pos), set()).add(c)
+            if chunks != Grid.chunks:
+                raise RuntimeError("Grid chunks out of sync with Grid.index")
+
+    def revert(journal):
+        # Put every cell in a journal back how it was when the journal was
+        # opened, reusing the same Cell objects. Returns the journal that
+        # reverts this again.
+        changes = []
+        for c, before in journal.items():
+            if before != Grid.cell_key(c):
+                changes.append((c, before))
+        undo = {c: Grid.cell_key(c) for c, _ in changes}
+
+        # Take the changed cells off the grid first so they cannot clash
+        removed = False
+        for c, _ in changes:
+            Grid.touch(c)
+            if c.alive:
+                Grid.unindex_cell(c)
+                Schedule.remove(c)
+                removed = True
+
+        revived = []
+        for c, before in changes:
+            if before is None:
+                c.alive = False
+                continue
+            x, y, dir = before
+            if not c.alive:
+                c.alive = True
+                revived.append(c)
+            c.pos, c.dir = Vector(x, y), dir
+            c.vel = ZERO
+            c.anim_from = c.anim_to = c.pos
+            c.anim_t = 1.0
+            c.render_rot = c.target_rot = DIR_ANGLES[dir]
+
+        # Grid.cells stays in creation order
+        if removed:
+            Grid.cells[:] = [c for c in Grid.cells if c.alive]
+        for c in revived:
+            insort(Grid.cells, c, key = lambda c: c.serial)
+        for c, _ in sorted(changes, key = lambda change: change[0].serial):
+            if c.alive:
+                Grid.index_cell(c)
+                Schedule.add(c)
+        return undo
+
+    def snapshot():
+        # Full copy of the grid, packed like pack_state(Grid.save_state())
+        packed = array("i")
+        for c in Grid.cells:
+            packed.extend((Cell.subclasses.index(c.__class__), c.pos.x, c.pos.y, c.dir))
+        return packed.tobytes()
+
+    def load_snapshot(packed):
+        Grid.load_state(unpack_state(packed))
+
+    def save_state():
+        saved = []
+        for c in Grid.cells:
+            saved.append({
+                "type": Cell.subclasses.index(c.__class__),
+                "x": c.pos.x,
+                "y": c.pos.y,
+                "dir": c.dir
+            })
+        return saved
+    
+    def load_state(state):
+        Grid.load_cells(
+            (Cell.subclasses[item["type"]], item["x"], item["y"], item["dir"])
+            for item in state
+        )
+
+    def load_cells(items):
+        # Replaces the grid with (cell class, x, y, dir index) items, in bulk
+        Grid.clear_all()
+        Grid.place_all([cell_class(Vector(x, y), dir, place = False) for cell_class, x, y, dir in items])
+
+    def place(cell):
+        # Puts a new cell on the grid, see Cell.__init__
+        Grid.touched[cell] = None
+        for journal in Grid.journals:
+            journal[cell] = None
+        Grid.cells.append(cell)
+        # The first cell on a tile wins, like the old linear scan did
+        Grid.index_cell(cell)
+        Schedule.add(cell)
+
+    def place_all(cells):
+        # Grid.place for many new cells, with one sort of the schedule
+        # instead of an insort per cell
+        for log in (Grid.touched, *Grid.journals):
+            log.update(dict.fromkeys(cells))
+        Grid.cells.extend(cells)
+        index = Grid.index
+        for c in cells:
+            index.setdefault((c.pos.x, c.pos.y), c)
+        if Grid.chunked:
+            # Rather than waking around each new cell, wake everything
+            s = CHUNK_SHIFT
+            for c in cells:
+                if index[(c.pos.x, c.pos.y)] is c:
+                    Grid.chunks.setdefault((c.pos.x >> s, c.pos.y >> s), set()).add(c)
+            Grid.woken.update(Grid.chunks)
+        Schedule.add_all(cells)
+
+    def open_journal():
+        # Starts recording every change, see Grid.revert
+        journal = {}
+        Grid.journals.append(journal)
+        return journal
+
+    def close_journal(journal):
+        # By identity: two journals can hold the same entries
+        Grid.journals[:] = [j for j in Grid.journals if j is not journal]
+        return journal
+
+    def push_state():
+        # Checkpoint: changes from here on are journaled instead of copying the grid
+        Grid.state_stack.append(Grid.open_journal())
+    
+    def pop_state():
+        Grid.revert(Grid.close_journal(Grid.state_stack.pop()))
+
+    # Undo and redo of edits. Everything between begin_edit and end_edit is
+    # one step. Edits made while a checkpoint is open (a running or paused
+    # simulation) are undone by pop_state instead.
+    def begin_edit():
+        return Grid.open_journal()
+
+    def end_edit(journal):
+        Grid.close_journal(journal)
+        if Grid.state_stack or not Grid.changed(journal): return
+        Grid.undo_stack.append(journal)
+        del Grid.undo_stack[:-Grid.undo_limit]
+        Grid.redo_stack.clear()
+
+    def undo():
+        if Grid.state_stack or not Grid.undo_stack: return
+        Grid.redo_stack.append(Grid.revert(Grid.undo_stack.pop()))
+
+    def redo():
+        if Grid.state_stack or not Grid.redo_stack: return
+        Grid.undo_stack.append(Grid.revert(Grid.redo_stack.pop()))
+
+# Tick schedule: cells bucketed by (priority, direction) and by chunk, each
+# bucket kept front-most first along its direction, ties broken by creation
+# order. Only cells that act are scheduled, see Cell.acts
+class Schedule:
+    buckets = {} # (priority, dir) -> {chunk: sorted [(axis, serial, cell)]}, chunk None unless Grid.chunked
+
+    def entry(cell):
+        # Front-most first: -x facing right, x facing left, y facing up, -y facing down
+        dir = DIRECTIONS[cell.dir]
+        axis = -(cell.pos.x * dir.x + cell.pos.y * dir.y)
+        return (axis, cell.serial, cell)
+
+    def chunks(priority, dir):
+        return Schedule.buckets.setdefault((priority, dir), {})
+
+    def add(cell):
+        if not cell.acts: return
+        cell.sched_entry = Schedule.entry(cell)
+        chunks = Schedule.chunks(cell.get_priority(), cell.dir)
+        insort(chunks.setdefault(Grid.chunk_of(cell.pos), []), cell.sched_entry)
+
+    def add_all(cells):
+        changed = set()
+        buckets = Schedule.buckets
+        for cell in cells:
+            if not cell.acts: continue
+            cell.sched_entry = Schedule.entry(cell)
+            key = (cell.get_priority(), cell.dir)
+            chunk = Grid.chunk_of(cell.pos)
+            if key not in buckets:
+                buckets[key] = {}
+            if chunk not in buckets[key]:
+                buckets[key][chunk] = []
+            buckets[key][chunk].append(cell.sched_entry)
+            changed.add((key, chunk))
+        for key, chunk in changed:
+            buckets[key][chunk].sort()
+
+    def remove(cell):
+        if not cell.acts: return
+        chunks = Schedule.chunks(cell.get_priority(), cell.dir)
+        chunk = Grid.chunk_of(cell.pos)
+        bucket = chunks[chunk]
+        axis, serial, _ = cell.sched_entry
+        del bucket[bisect_left(bucket, (axis, serial))]
+        if not bucket:
+            del chunks[chunk]
+
+    def clear():
+        Schedule.buckets.clear()
+
+    def order(priority, directions, chunks = None):
+        # Only cells in the given chunks, or everywhere if None
+        order = []
+        for dir in directions:
+            by_chunk = Schedule.chunks(priority, dir)
+            if chunks is None:
+                buckets = list(by_chunk.values())
+            elif len(chunks) < len(by_chunk):
+                buckets = [by_chunk[chunk] for chunk in chunks if chunk in by_chunk]
+            else:
+                buckets = [bucket for chunk, bucket in by_chunk.items() if chunk in chunks]
+            if len(buckets) > 1:
+                # Sorting already sorted runs is a merge, and faster than heapq.merge
+                buckets = [sorted(itertools.chain.from_iterable(buckets))]
+            if buckets:
+                order.extend(c for _, _, c in buckets[0])
+        return order
+
+    def has_chunk(chunk):
+        # Whether any scheduled cell is in chunk
+        return any(chunk in by_chunk for by_chunk in Schedule.buckets.values())
+
+    def check(directions):
+        # Debug only: compare against a full filter and sort of Grid.cells
+        for priority in range(Cell.max_priority + 1):
+            expected = []
+            for dir in directions:
+                matching = [c for c in Grid.cells if c.acts and c.dir == dir and c.get_priority() == priority]
+                expected.extend(sorted(matching, key = lambda c: Schedule.entry(c)[0]))
+            if Schedule.order(priority, directions) != expected:
+                raise RuntimeError(f"Tick schedule out of sync at priority {priority}")
+
+# Helpers
+def shortest_angle(a, b):
+    diff = (b - a + 180) % 360 - 180
+    return a + diff
+
+TICK_RATE = 10 # cells per second
+
+# How a cell reacts to being pushed, see Grid.resolve_push
+GIVES_WAY = 0 # moves along with the push
+BLOCKS = 1    # stops the push
+EATS = 2      # destroys the cell pushing into it
+EXPLODES = 3  # destroys the cell pushing into it, and itself
+
+# Main cell class. Subclasses declare __slots__ = () so cells stay small.
+class Cell:
+    __slots__ = ("pos", "dir", "vel", "anim_from", "anim_to", "anim_t", "render_rot", "target_rot", "alive", "serial", "sched_entry")
+    pos: Vector[int]
+    dir: int
+    vel: Vector[int]
+    anim_from: Vector[int]
+    anim_to: Vector[int]
+    anim_t: float
+    render_rot: float
+    target_rot: float
+
+    max_priority = 0
+    acts = False # whether tick() does anything, set for each subclass
+    serials = itertools.count() # creation order, used to break ties in the schedule
+    free = {} # class -> destroyed cells to reuse, see Grid.recycle
+    free_limit = 256
+
+    def __new__(cls, *args, **kwargs):
+        # __init__ sets every slot again, so a reused cell is as good as new
+        free = Cell.free.get(cls)
+        return free.pop() if free else object.__new__(cls)
+
+    def __init__(self, pos, dir, place = True):
+        self.pos = pos
+        self.dir = dir
+        self.vel = ZERO
+        self.anim_from = pos
+        self.anim_to = pos
+        self.anim_t = 1.0
+        self.render_rot = DIR_ANGLES[dir]
+        self.target_rot = self.render_rot
+        self.alive = True
+        self.serial = next(Cell.serials)
+        if place:
+            Grid.place(self)
+    
+    subclasses = []
+    types = {} # type_id -> subclass. Saved levels use these, so never change one.
+    def __init_subclass__(cls):
+        Cell.subclasses.append(cls)
+        Cell.types[cls.type_id] = cls
+        cls.acts = cls.tick is not Cell.tick
+        if Cell.max_priority < cls.get_priority(None):
+            Cell.max_priority = cls.get_priority(None)
+    
+    def shallow_copy(self, pos = None):
+        new = self.__class__(self.pos if pos is None else pos, self.dir)
+        new.vel = self.vel
+        new.anim_from = self.anim_from
+        new.anim_to = self.anim_to
+        new.anim_t = self.anim_t
+        new.render_rot = self.render_rot
+        new.target_rot = self.target_rot
+        return new
+    
+    def futurePos(self):
+        new = self.pos + self.vel
+        if Grid.getCellAt(new) is not None: return
+        if not Grid.isInBounds(new): return
+        return new
+
+    def move(self, vel = None):
+        vel = vel or self.vel
+        self.vel = ZERO
+
+        if vel == ZERO: return
+        
+        self.finish_animation()
+        
+        self.vel = ZERO
+        new = self.pos + vel
+        if (cell_in_front := Grid.getCellAt(new)) is not None:
+            cell_in_front.apply_force(vel, self)
+            if Grid.getCellAt(new) is not None: return
+            
+        if not Grid.isInBounds(new): return
+        
+        self.relocate(new)
+
+    def relocate(self, new):
+        # The last step of a successful move
+        if Grid.animate:
+            if self.anim_from == self.anim_to: self.anim_from = self.pos
+            self.anim_to = new
+            self.anim_t = 0.0
+
+        Grid.move_cell(self, new)
+    
+    def destroy(self):
+        if not self.alive: return
+        # Created this tick, so once it is out of the logs below nothing refers to it
+        if Grid.dead is not None and Grid.touched.get(self, False) is None:
+            Grid.dead.append(self)
+        for log in (Grid.touched, *Grid.journals):
+            if self in log and log[self] is None:
+                # Created since the log started, so as far as it knows the cell never existed
+                del log[self]
+            elif self not in log:
+                log[self] = Grid.cell_key(self)
+        self.alive = False
+        Grid.cells.remove(self)
+        Grid.unindex_cell(self)
+        Schedule.remove(self)
+    
+    def __str__(self):
+        return f"{self.get_label()} at {self.pos} facing {DIRECTIONS[self.dir]}"
+    
+    def rotate(self, new_dir):
+        if self.alive:
+            Grid.touch(self)
+            Schedule.remove(self)
+            self.dir = new_dir
+            Schedule.add(self)
+            if Grid.chunked:
+                Grid.wake(self.pos.x, self.pos.y)
+        else:
+            self.dir = new_dir
+        self.target_rot = DIR_ANGLES[new_dir]
+
+    def update_animation(self, dt):
+        # position animation
+        if self.anim_t < 1.0:
+            self.anim_t += TICK_RATE * dt
+            if self.anim_t > 1.0:
+                self.anim_t = 1.0
+
+        # rotation animation
+        ROTATE_SPEED = 200
+        diff = (self.target_rot - self.render_rot + 180) % 360 - 180
+        step = ROTATE_SPEED * dt * TICK_RATE
+
+        if abs(diff) <= step:
+            self.render_rot = self.target_rot
+        else:
+            self.render_rot += step if diff > 0 else -step
+    
+    def finish_animation(self):
+        Grid.touch(self)
+        if self.anim_t < 1.0:
+            t = self.anim_t
+            self.anim_from = Vector(
+                self.anim_from.x + (self.anim_to.x - self.anim_from.x) * t,
+                self.anim_from.y + (self.anim_to.y - self.anim_from.y) * t,
+            )
+
+        self.anim_to = self.anim_from
+        self.anim_t = 1.0
+    
+    def get_render_pos(self):
+        t = self.anim_t
+        return Vector(
+            self.anim_from.x + (self.anim_to.x - self.anim_from.x) * t,
+            self.anim_from.y + (self.anim_to.y - self.anim_from.y) * t,
+        )
+    
+    # These are all to be set by subclasses
+    def get_label(self): pass
+    def get_desc(self): pass
+    def get_image(self): pass
+    def get_priority(self): pass
+    def tick(self): pass
+    def push_reaction(self, force): return GIVES_WAY
+    def apply_force(self, force, cell=None):
+        Grid.resolve_push(self, force, cell)
+
+class Wall(Cell):
+    __slots__ = ()
+    type_id = "wall"
+    def get_label(self): return "Wall"
+    def get_desc(self): return "Cannot be moved"
+    def get_image(self): return "cell_wall"
+    def get_priority(self): return 0
+    def push_reaction(self, force): return BLOCKS
+
+class Mover(Cell):
+    __slots__ = ()
+    type_id = "mover"
+    def get_label(self): return "Mover"
+    def get_desc(self): return "Moves forward over time"
+    def get_image(self): return "cell_mover"
+    def get_priority(self): return 3
+    def tick(self):
+        dir = DIRECTIONS[self.dir]
+        if (cellInFront := Grid.getCellAt(self.pos + dir)) is not None:
+            cellInFront.apply_force(dir, self)
+        self.vel = dir if self.vel == ZERO else self.vel + dir
+
+class Generator(Cell):
+    __slots__ = ()
+    type_id = "generator"
+    def get_label(self): return "Generator"
+    def get_desc(self): return "Generates the cell behind it in front of it"
+    def get_image(self): return "cell_generator"
+    def get_priority(self): return 1
+
+    def tick(self):
+        dir = DIRECTIONS[self.dir]
+        back_pos = self.pos - dir
+
+        source = Grid.getCellAt(back_pos)
+        if source is None:
+            return
+
+        # The copy starts on top of the generator, which keeps its tile in the index
+        new_cell = source.shallow_copy(self.pos)
+        new_cell.apply_force(dir)
+
+        if new_cell.pos == self.pos:
+            new_cell.destroy()
+
+class RotatorCW(Cell):
+    __slots__ = ()
+    type_id = "rotator_cw"
+    def get_label(self): return "Rotator (clockwise)"
+    def get_desc(self): return "Rotates adjacent cells clockwise 90 degrees"
+    def get_image(self): return "cell_rotatorcw"
+    def get_priority(self): return 2
+    def tick(self):
+        if (cellU := Grid.getCellAt(self.pos + UP)) is not None:
+            cellU.rotate((cellU.dir + 1) % 4)
+        if (cellD := Grid.getCellAt(self.pos + DOWN)) is not None:
+            cellD.rotate((cellD.dir + 1) % 4)
+        if (cellL := Grid.getCellAt(self.pos + LEFT)) is not None:
+            cellL.rotate((cellL.dir + 1) % 4)
+        if (cellR := Grid.getCellAt(self.pos + RIGHT)) is not None:
+            cellR.rotate((cellR.dir + 1) % 4)
+
+class RotatorCCW(Cell):
+    __slots__ = ()
+    type_id = "rotator_ccw"
+    def get_label(self): return "Rotator (counter-clockwise)"
+    def get_desc(self): return "Rotates adjacent cells counter-clockwise 90 degrees"
+    def get_image(self): return "cell_rotatorccw"
+    def get_priority(self): return 2
+    def tick(self):
+        if (cellU := Grid.getCellAt(self.pos + UP)) is not None:
+            cellU.rotate((cellU.dir + 3) % 4)
+        if (cellD := Grid.getCellAt(self.pos + DOWN)) is not None:
+            cellD.rotate((cellD.dir + 3) % 4)
+        if (cellL := Grid.getCellAt(self.pos + LEFT)) is not None:
+            cellL.rotate((cellL.dir + 3) % 4)
+        if (cellR := Grid.getCellAt(self.pos + RIGHT)) is not None:
+            cellR.rotate((cellR.dir + 3) % 4)
+
+class Rotator180(Cell):
+    __slots__ = ()
+    type_id = "rotator_180"
+    def get_label(self): return "Rotator (180)"
+    def get_desc(self): return "Rotates adjacent cells 180 degrees"
+    def get_image(self): return "cell_rotator180"
+    def get_priority(self): return 2
+    def tick(self):
+        if (cellU := Grid.getCellAt(self.pos + UP)) is not None:
+            cellU.rotate((cellU.dir + 2) % 4)
+        if (cellD := Grid.getCellAt(self.pos + DOWN)) is not None:
+            cellD.rotate((cellD.dir + 2) % 4)
+        if (cellL := Grid.getCellAt(self.pos + LEFT)) is not None:
+            cellL.rotate((cellL.dir + 2) % 4)
+        if (cellR := Grid.getCellAt(self.pos + RIGHT)) is not None:
+            cellR.rotate((cellR.dir + 2) % 4)
+
+class Push(Cell):
+    __slots__ = ()
+    type_id = "push"
+    def get_label(self): return "Push"
+    def get_desc(self): return "Can be pushed by other cells"
+    def get_image(self): return "cell_push"
+    def get_priority(self): return 0
+
+class Slide(Cell):
+    __slots__ = ()
+    type_id = "slide"
+    def get_label(self): return "Slide"
+    def get_desc(self): return "Can be pushed only in the indicated direction"
+    def get_image(self): return "cell_slide"
+    def get_priority(self): return 0
+    def push_reaction(self, force):
+        if force == DIRECTIONS[self.dir] or force == DIRECTIONS[(self.dir + 2) % 4]:
+            return GIVES_WAY
+        return BLOCKS
+    
+class Enemy(Cell):
+    __slots__ = ()
+    type_id = "enemy"
+    def get_label(self): return "Enemy"
+    def get_desc(self): return "Destroys any cell that moves into it, along with itself"
+    def get_image(self): return "cell_enemy"
+    def get_priority(self): return 0  
+    def push_reaction(self, force): return EXPLODES
+
+class Trash(Cell):
+    __slots__ = ()
+    type_id = "trash"
+    def get_label(self): return "Trash"
+    def get_desc(self): return "Destroys any cell that moves into it"
+    def get_image(self): return "cell_trash"
+    def get_priority(self): return 0
+    def push_reaction(self, force): return EATS
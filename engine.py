@@ -0,0 +1,166 @@
+"""
+Tick logic, kept apart from the pygame loop so it can be stepped headless.
+"""
+
+import hashlib
+from collections import deque
+
+from cells import Grid, Cell, Schedule, DIRECTIONS, RIGHT, LEFT, UP, DOWN
+
+TICK_DIRECTIONS = [DIRECTIONS.index(dir) for dir in (RIGHT, LEFT, UP, DOWN)]
+
+# Recent grid snapshots by digest, oldest dropped first. Every snapshot is
+# kept so the engine can jump to any tick inside a cycle it has found.
+class CycleCache:
+    def __init__(self, size):
+        self.size = size
+        self.states = deque() # (tick, digest, snapshot), one per consecutive tick
+        self.ticks = {} # digest -> tick
+
+    def clear(self):
+        self.states.clear()
+        self.ticks.clear()
+
+    def record(self, tick, packed):
+        # Returns the earlier tick with the same snapshot, if there is one
+        if self.states and self.states[-1][0] != tick - 1:
+            # Some ticks were not recorded, so the stored states cannot be replayed
+            self.clear()
+
+        digest = hashlib.blake2b(packed, digest_size = 16).digest()
+        if (earlier := self.ticks.get(digest)) is not None:
+            return earlier
+
+        self.states.append((tick, digest, packed))
+        self.ticks[digest] = tick
+        if len(self.states) > self.size:
+            _, old, _ = self.states.popleft()
+            del self.ticks[old]
+
+    def state_at(self, tick):
+        return self.states[tick - self.states[0][0]][2]
+
+# Stepping shared by Engine and ArrayEngine
+class Runner:
+    def step(self, n = 1):
+        for _ in range(n):
+            self.tick()
+
+    def run(self, n):
+        # Like step(n), but stops once the board settles and, with a cycle
+        # cache, jumps straight to the end once a state repeats.
+        # Returns the ticks actually simulated.
+        target = self.ticks + n
+        simulated = 0
+        if self.cycles:
+            self.cycles.record(self.ticks, self.snapshot())
+
+        while self.ticks < target:
+            self.tick()
+            simulated += 1
+            if self.quiescent:
+                break
+            if self.cycles and (earlier := self.cycles.record(self.ticks, self.snapshot())) is not None:
+                self.period = self.ticks - earlier
+                self.load_snapshot(self.cycles.state_at(earlier + (target - earlier) % self.period))
+                self.cycles.clear()
+                break
+
+        self.ticks = target
+        return simulated
+
+class Engine(Runner):
+    def __init__(self, cycle_cache = 0):
+        self.ticks = 0
+        self.quiescent = False # the last tick changed nothing
+        self.period = None # length of the last cycle found by run()
+        self.cycles = CycleCache(cycle_cache) if cycle_cache else None
+        self.last_touched = {}
+
+    def save_state(self):
+        return Grid.save_state()
+
+    def load_state(self, state):
+        Grid.load_state(state)
+        self.forget_edits()
+
+    def snapshot(self):
+        return Grid.snapshot()
+
+    def load_snapshot(self, packed):
+        Grid.load_snapshot(packed)
+        self.forget_edits()
+
+    def forget_edits(self):
+        # The grid was set to a state some tick would have produced, so it is
+        # not an edit, but what the last tick saw no longer applies either
+        Grid.touched = {}
+        self.quiescent = False
+        self.last_touched = {}
+
+    def tick(self):
+        # Anything touched since the last tick was edited from outside
+        edited = Grid.changed(Grid.touched)
+        touched = self.last_touched | Grid.touched
+        Grid.touched = {}
+        self.ticks += 1
+
+        if edited and self.cycles:
+            self.cycles.clear()
+        if self.quiescent and not edited:
+            # Nothing happened since a tick that changed nothing, so neither will this one
+            self.last_touched = touched
+            return
+
+        # Cells that do not act only need their animation reset, and only
+        # if something touched them last tick
+        animate = Grid.animate
+        if animate:
+            for c in touched:
+                if c.alive and not c.acts:
+                    c.anim_from = c.pos
+
+        Grid.dead = []
+        if Grid.chunked:
+            self.tick_chunks()
+        else:
+            self.run_phases(None)
+        Grid.recycle()
+
+        self.quiescent = not Grid.changed(Grid.touched)
+        self.last_touched = Grid.touched
+        Grid.touched = {}
+        if Grid.debug:
+            Grid.check_index()
+            Schedule.check(TICK_DIRECTIONS)
+
+    def run_phases(self, chunks):
+        # By priority, then by direction and position (kept sorted by Schedule)
+        animate = Grid.animate
+        for priority in range(Cell.max_priority + 1):
+            tick_order = Schedule.order(priority, TICK_DIRECTIONS, chunks)
+
+            # One pass for ticking cells
+            for c in tick_order:
+                if animate: c.anim_from = c.pos
+                c.tick()
+            # Another pass for moving cells
+            for c in tick_order:
+                c.move()
+
+    def tick_chunks(self):
+        # Only chunks woken since the last tick are ticked. A chunk nothing
+        # changed around last tick would do exactly nothing again. If this
+        # tick wakes a chunk that was skipped, undo it and tick again with
+        # that chunk too, so the result is the same as ticking everything.
+        awake = Grid.woken
+        while True:
+            Grid.woken = set()
+            Grid.walked = set()
+            self.run_phases(awake)
+            missed = {chunk for chunk in Grid.woken - awake if Schedule.has_chunk(chunk)}
+            if not missed:
+                break
+            # Grid.touched holds everything this tick changed so far
+            Grid.revert(Grid.touched)
+            awake = awake | missed
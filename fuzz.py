@@ -0,0 +1,145 @@
+"""
+Differential fuzzer: random small boards, ticked by reference.py and by one
+of the fast engines side by side, compared after every tick.
+
+    python fuzz.py --engine engine --boards 1000 --ticks 20
+    python fuzz.py --engine vectorized --out repro.json
+
+On a mismatch (or a crash) the board is shrunk to the fewest cells that
+still go wrong, and written out as JSON: the grid range, the cells in
+Grid.save_state form, and the tick where the engines first disagree.
+"""
+
+import argparse
+import json
+import random
+import sys
+import traceback
+
+from cells import Grid, Cell, UNBOUNDED
+from engine import Engine
+from reference import ReferenceGrid
+
+ENGINES = ["engine", "chunked", "vectorized"]
+
+def random_board(rng, size, types, bounded = False):
+    # Up to size * size cells on a size x size patch, at any density
+    tiles = [(x, y) for x in range(size) for y in range(size)]
+    tiles = rng.sample(tiles, rng.randint(1, len(tiles)))
+    state = [
+        {"type": Cell.subclasses.index(rng.choice(types)), "x": x, "y": y, "dir": rng.randrange(4)}
+        for x, y in tiles
+    ]
+    # Edges right at the patch, a little way off, or none at all
+    margin = rng.choice([0, 0, 2] if bounded else [0, 0, 2, None])
+    if margin is None:
+        return state, UNBOUNDED
+    return state, ((-margin, size - 1 + margin), (-margin, size - 1 + margin))
+
+def engine_states(engine, state, bounds, ticks):
+    # Yields the engine's save_state after each tick
+    if engine == "vectorized":
+        from vectorized import ArrayGrid, ArrayEngine
+        runner = ArrayEngine(ArrayGrid(bounds))
+        runner.load_state(state)
+    else:
+        Grid.range = bounds
+        Grid.set_chunked(False)
+        Grid.load_state(state)
+        Grid.set_chunked(engine == "chunked")
+        runner = Engine()
+    for _ in range(ticks):
+        runner.step()
+        yield runner.save_state()
+
+def first_mismatch(engine, state, bounds, ticks):
+    # (tick, expected, actual) for the first tick that differs, or None.
+    # A crash counts as a mismatch, with the traceback as actual.
+    reference = ReferenceGrid(state, bounds)
+    states = engine_states(engine, state, bounds, ticks)
+    for tick in range(1, ticks + 1):
+        reference.tick()
+        expected = reference.save_state()
+        try:
+            actual = next(states)
+        except Exception:
+            return tick, expected, traceback.format_exc()
+        if actual != expected:
+            return tick, expected, actual
+    return None
+
+def shrink(engine, state, bounds, ticks):
+    # Drop ever smaller runs of cells for as long as the board still fails,
+    # cutting the ticks down to the first bad one as it goes
+    ticks = first_mismatch(engine, state, bounds, ticks)[0]
+    chunk = len(state) // 2
+    while chunk >= 1:
+        i = 0
+        while i < len(state):
+            candidate = state[:i] + state[i + chunk:]
+            if candidate and (found := first_mismatch(engine, candidate, bounds, ticks)) is not None:
+                state, ticks = candidate, found[0]
+            else:
+                i += chunk
+        chunk //= 2
+    return state, ticks
+
+def fuzz(engine, boards, ticks, size, seed = None, log = None):
+    # Checks random boards until one fails. Returns its shrunk repro, or None.
+    rng = random.Random(seed)
+    if engine == "vectorized":
+        from vectorized import SIMPLE_TYPES as types
+    else:
+        types = Cell.subclasses
+    saved_range, saved_chunked = Grid.range, Grid.chunked
+    try:
+        for board in range(boards):
+            state, bounds = random_board(rng, size, types, bounded = engine == "vectorized")
+            if first_mismatch(engine, state, bounds, ticks) is None:
+                continue
+            if log:
+                log(f"board {board} failed with {len(state)} cells, shrinking")
+            state, bad_tick = shrink(engine, state, bounds, ticks)
+            _, expected, actual = first_mismatch(engine, state, bounds, bad_tick)
+            return {
+                "engine": engine,
+                "board": board,
+                "range": bounds,
+                "state": state,
+                "ticks": bad_tick,
+                "expected": expected,
+                "actual": actual,
+            }
+        return None
+    finally:
+        Grid.range = saved_range
+        Grid.set_chunked(False)
+        Grid.load_state([])
+        Grid.set_chunked(saved_chunked)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Check an engine against reference.py on random boards")
+    parser.add_argument("-e", "--engine", choices = ENGINES, default = "engine")
+    parser.add_argument("-b", "--boards", type = int, default = 500)
+    parser.add_argument("-n", "--ticks", type = int, default = 20)
+    parser.add_argument("-s", "--size", type = int, default = 6, help = "side of the patch cells are placed on")
+    parser.add_argument("--seed", type = int)
+    parser.add_argument("-o", "--out", help = "where to write a failing board (default: stdout)")
+    args = parser.parse_args(argv)
+
+    repro = fuzz(args.engine, args.boards, args.ticks, args.size, args.seed, log = lambda text: print(text, file = sys.stderr))
+    if repro is None:
+        print(f"{args.boards} boards, no differences", file = sys.stderr)
+        return 0
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(repro, f, indent = 1)
+        print(f"{len(repro['state'])} cells differ at tick {repro['ticks']}, written to {args.out}", file = sys.stderr)
+    else:
+        json.dump(repro, sys.stdout, indent = 1)
+        sys.stdout.write("\n")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
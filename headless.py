@@ -0,0 +1,92 @@
+"""
+Run a saved level without a display.
+
+    python headless.py level.json --ticks 1000 --out final.json
+
+The level is a level file (see levels.py), a Cell Machine level code, or a
+JSON list as produced by Grid.save_state. The result is written as JSON
+with the final state and the measured ticks per second.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import levels
+from cells import Grid, UNBOUNDED
+from engine import Engine
+
+def run(state, ticks, vectorized = False, cycle_cache = 0, chunked = False):
+    if vectorized:
+        # NumPy is only needed for this mode
+        from vectorized import ArrayGrid, ArrayEngine
+        grid = ArrayGrid()
+        grid.load_state(state)
+        engine = ArrayEngine(grid, cycle_cache)
+    else:
+        grid = Grid
+        grid.load_state(state)
+        grid.set_chunked(chunked)
+        engine = Engine(cycle_cache)
+
+    # Once the board settles every later tick is the same, so stop there. With a
+    # cycle cache, a repeated state also ends the run with a jump to the last tick.
+    start = time.perf_counter()
+    simulated = engine.run(ticks)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "ticks": engine.ticks,
+        "simulated_ticks": simulated,
+        "quiescent": engine.quiescent,
+        "period": engine.period,
+        "seconds": elapsed,
+        "ticks_per_second": simulated / elapsed if elapsed > 0 else None,
+        "state": grid.save_state(),
+    }
+
+def read_level(level):
+    # Any of the level kinds headless accepts, as a Grid.save_state list
+    if not os.path.exists(level) and level[:3] in ("V1;", "V3;"):
+        levels.import_code(level)
+        return Grid.save_state()
+    if levels.is_level_file(level):
+        levels.load(level)
+        return Grid.save_state()
+    with open(level) as f:
+        return json.load(f)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Run a Pyxell level headless")
+    parser.add_argument("level", help = "level file, Cell Machine level code, or JSON from Grid.save_state")
+    parser.add_argument("-n", "--ticks", type = int, default = 100)
+    parser.add_argument("-o", "--out", help = "where to write the result (default: stdout)")
+    parser.add_argument("--debug", action = "store_true", help = "check the grid index after every tick")
+    parser.add_argument("--cycles", type = int, default = 0, metavar = "SIZE",
+                        help = "remember up to SIZE recent states and skip ahead when one repeats")
+    parser.add_argument("--vectorized", action = "store_true", help = "use the NumPy engine (simple cell types only)")
+    parser.add_argument("--chunked", action = "store_true", help = "skip the parts of the grid where nothing is happening")
+    parser.add_argument("--unbounded", action = "store_true", help = "remove the grid edges (implies --chunked)")
+    args = parser.parse_args(argv)
+
+    Grid.debug = args.debug
+
+    try:
+        state = read_level(args.level)
+        if args.unbounded:
+            Grid.range = UNBOUNDED
+        result = run(state, args.ticks, args.vectorized, args.cycles, args.chunked or args.unbounded)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f)
+    else:
+        json.dump(result, sys.stdout)
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Level files and Cell Machine level codes.
+
+A level file starts with a small text header: the format version, the grid
+range and the cell types used, by their stable Cell.type_id. The cells
+follow one row at a time, run-length encoded. The same rows can be packed
+as a zlib-compressed int array instead (binary = True).
+
+    pyxell 1
+    range -50 50 -50 50
+    types wall mover
+    row -3 -10 0.0x4 _2 1.2
+    ...
+
+Row tokens: "T.D" is one cell of type T (index into the types line) facing
+D (0 right, 1 down, 2 left, 3 up), "T.DxN" is N of them in a row, "_N"
+skips N empty tiles. Cells are read back in row order, without going
+through Grid.getCellAt, and put on the grid in bulk.
+"""
+
+import io
+import sys
+import zlib
+from array import array
+
+from cells import Grid, Cell, Generator, RotatorCW, RotatorCCW, Mover, Slide, Push, Wall, Enemy, Trash
+
+FORMAT_VERSION = 1
+BINARY_MAGIC = b"PYXB"
+GAP = -1 # type of a run of empty tiles in the binary rows
+
+def grid_rows():
+    # [(y, [(x, type, dir), ...]), ...] sorted, one cell per tile like Grid.index
+    rows = {}
+    for (x, y), c in Grid.index.items():
+        rows.setdefault(y, []).append((x, c.__class__, c.dir))
+    return [(y, sorted(rows[y], key = lambda cell: cell[0])) for y in sorted(rows)]
+
+def row_runs(cells, type_index):
+    # (count, type, dir) runs covering a row from its first cell, type GAP for empty tiles
+    runs = []
+    next_x = cells[0][0]
+    for x, cell_class, dir in cells:
+        if x > next_x:
+            runs.append([x - next_x, GAP, 0])
+        t = type_index[cell_class]
+        if runs and runs[-1][1] == t and runs[-1][2] == dir and x == next_x:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, t, dir])
+        next_x = x + 1
+    return runs
+
+def write_header(f, types):
+    f.write(f"pyxell {FORMAT_VERSION}\n")
+    f.write("range " + " ".join("none" if v is None else str(v) for pair in Grid.range for v in pair) + "\n")
+    f.write("types " + " ".join(t.type_id for t in types) + "\n")
+
+def save(path, binary = False):
+    rows = grid_rows()
+    used = {cell_class for _, cells in rows for _, cell_class, _ in cells}
+    types = [t for t in Cell.subclasses if t in used]
+    type_index = {t: i for i, t in enumerate(types)}
+
+    with open(path, "wb") as f:
+        if binary:
+            f.write(BINARY_MAGIC)
+            header = io.StringIO()
+            write_header(header, types)
+            f.write(header.getvalue().encode() + b"\n")
+
+            body = array("i")
+            for y, cells in rows:
+                runs = row_runs(cells, type_index)
+                body.extend((y, cells[0][0], len(runs)))
+                for run in runs:
+                    body.extend(run)
+            if sys.byteorder == "big":
+                body.byteswap()
+            f.write(zlib.compress(body.tobytes()))
+            return
+
+        text = io.TextIOWrapper(f, encoding = "utf-8", newline = "\n")
+        write_header(text, types)
+        for y, cells in rows:
+            tokens = []
+            for count, t, dir in row_runs(cells, type_index):
+                if t == GAP:
+                    tokens.append(f"_{count}")
+                else:
+                    tokens.append(f"{t}.{dir}" + (f"x{count}" if count > 1 else ""))
+            text.write(f"row {y} {cells[0][0]} {' '.join(tokens)}\n")
+        text.detach()
+
+def read_header(lines):
+    # lines yields header lines; returns (range, types)
+    version = next(lines).split()
+    if len(version) != 2 or version[0] != "pyxell":
+        raise ValueError("Not a Pyxell level file")
+    if int(version[1]) > FORMAT_VERSION:
+        raise ValueError(f"Level file version {version[1]} is newer than this Pyxell supports")
+
+    bounds = [None if v == "none" else int(v) for v in next(lines).split()[1:]]
+    range = ((bounds[0], bounds[1]), (bounds[2], bounds[3]))
+    types = []
+    for type_id in next(lines).split()[1:]:
+        if type_id not in Cell.types:
+            raise ValueError(f"Unknown cell type {type_id!r}")
+        types.append(Cell.types[type_id])
+    return range, types
+
+def text_cells(lines, types):
+    for line in lines:
+        parts = line.split()
+        if not parts: continue
+        y, x = int(parts[1]), int(parts[2])
+        for token in parts[3:]:
+            if token[0] == "_":
+                x += int(token[1:])
+                continue
+            cell, _, count = token.partition("x")
+            t, dir = cell.split(".")
+            cell_class, dir = types[int(t)], int(dir)
+            for _ in range(int(count or 1)):
+                yield cell_class, x, y, dir
+                x += 1
+
+def binary_cells(body, types):
+    values = array("i")
+    values.frombytes(body)
+    if sys.byteorder == "big":
+        values.byteswap()
+    i = 0
+    while i < len(values):
+        y, x, runs = values[i], values[i + 1], values[i + 2]
+        i += 3
+        for _ in range(runs):
+            count, t, dir = values[i], values[i + 1], values[i + 2]
+            i += 3
+            if t != GAP:
+                cell_class = types[t]
+                for k in range(count):
+                    yield cell_class, x + k, y, dir
+            x += count
+
+def load(path):
+    # Replaces the grid (and its range) with the level in path
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+            data = f.read()
+            header, _, body = data.partition(b"\n\n")
+            range, types = read_header(iter(header.decode().splitlines()))
+            cells = binary_cells(zlib.decompress(body), types)
+        else:
+            f.seek(0)
+            lines = io.TextIOWrapper(f, encoding = "utf-8")
+            range, types = read_header(lines)
+            cells = text_cells(lines, types)
+        Grid.range = range
+        Grid.load_cells(cells)
+
+def is_level_file(path):
+    with open(path, "rb") as f:
+        start = f.read(7)
+    return start.startswith(BINARY_MAGIC) or start == b"pyxell "
+
+# Cell Machine level codes. Cell Machine counts y upwards from the bottom row,
+# so rows are flipped, and the level is centred on (0, 0) with the grid range
+# set to its borders.
+CM_TYPES = [Generator, RotatorCW, RotatorCCW, Mover, Slide, Push, Wall, Enemy, Trash]
+B74 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ!$%&+-.=?^{}"
+B74_VALUES = {c: i for i, c in enumerate(B74)}
+CM_EMPTY = 72 # V3 value of an empty tile, 73 if it is also placeable
+
+def from_b74(text):
+    n = 0
+    for c in text:
+        n = n * 74 + B74_VALUES[c]
+    return n
+
+def to_b74(n):
+    digits = B74[n % 74]
+    while n >= 74:
+        n //= 74
+        digits = B74[n % 74] + digits
+    return digits
+
+def decode_v3(data):
+    # Tile values with Cell Machine's back references expanded: ")OL" repeats
+    # L values from O + 1 back, "(" starts a longer offset and/or length
+    values = []
+    i = 0
+    while i < len(data):
+        c = data[i]
+        if c not in "()":
+            values.append(B74_VALUES[c])
+            i += 1
+            continue
+        if c == ")":
+            offset, length = B74_VALUES[data[i + 1]], B74_VALUES[data[i + 2]]
+            i += 3
+        else:
+            end = i + 1
+            while data[end] not in "()":
+                end += 1
+            offset = from_b74(data[i + 1:end])
+            if data[end] == ")":
+                length = B74_VALUES[data[end + 1]]
+                i = end + 2
+            else:
+                close = data.index(")", end + 1)
+                length = from_b74(data[end + 1:close])
+                i = close + 1
+        for _ in range(length):
+            values.append(values[-offset - 1])
+    return values
+
+def encode_v3(values):
+    # Runs of the same value become ")0L"-style back references
+    out = []
+    i = 0
+    while i < len(values):
+        j = i + 1
+        while j < len(values) and values[j] == values[i]:
+            j += 1
+        out.append(B74[values[i]])
+        repeats = j - i - 1
+        if repeats > 3:
+            length = to_b74(repeats)
+            out.append(")0" + length if len(length) == 1 else "(0(" + length + ")")
+        else:
+            out.append(B74[values[i]] * repeats)
+        i = j
+    return "".join(out)
+
+def import_code(code):
+    # Replaces the grid with a V1 or V3 Cell Machine level code
+    fields = code.strip().split(";")
+    if fields[0] == "V1":
+        width, height = int(fields[1]), int(fields[2])
+        cells = []
+        for cell in filter(None, fields[4].split(",")):
+            t, dir, x, y = map(int, cell.split("."))
+            cells.append((t, dir, x, y))
+    elif fields[0] == "V3":
+        width, height = from_b74(fields[1]), from_b74(fields[2])
+        cells = []
+        for i, v in enumerate(decode_v3(fields[3])):
+            if v < CM_EMPTY:
+                cells.append(((v // 2) % 9, v // 18, i % width, i // width))
+    else:
+        raise ValueError(f"Unsupported level code format {fields[0]!r}")
+
+    x0, y0 = -(width // 2), -(height // 2)
+    Grid.range = ((x0, x0 + width - 1), (y0, y0 + height - 1))
+    Grid.load_cells(
+        (CM_TYPES[t], x0 + x, y0 + height - 1 - y, dir)
+        for t, dir, x, y in sorted(cells, key = lambda cell: (-cell[3], cell[2]))
+    )
+
+def export_code():
+    # The grid as a V3 level code, bounded by the grid range or else by its cells
+    (xmin, xmax), (ymin, ymax) = Grid.range
+    if None in (xmin, xmax, ymin, ymax):
+        xs = [x for x, _ in Grid.index] or [0]
+        ys = [y for _, y in Grid.index] or [0]
+        xmin, xmax, ymin, ymax = min(xs), max(xs), min(ys), max(ys)
+    width, height = xmax - xmin + 1, ymax - ymin + 1
+
+    values = [CM_EMPTY] * (width * height)
+    for (x, y), c in Grid.index.items():
+        if c.__class__ not in CM_TYPES:
+            raise ValueError(f"{c.__class__.__name__} cells have no Cell Machine code")
+        values[(x - xmin) + (ymax - y) * width] = 2 * CM_TYPES.index(c.__class__) + 18 * c.dir
+    return f"V3;{to_b74(width)};{to_b74(height)};{encode_v3(values)};;"
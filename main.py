@@ -6,434 +6,58 @@ TODO
 """
 
 VERSION = "1.0"
+FRAME_RATE = 60
+TICK_BUDGET = 0.75 / FRAME_RATE # seconds of each frame that ticks may use
+LEVEL_FILE = "level.pyxl"
 
 import pygame
 import os
+import sys
 import math
+import time
+
+from cells import Vector, Grid, Cell, DIR_ANGLES, TICK_RATE, UNBOUNDED
+from engine import Engine
+from timeline import Timeline
+import levels
+from render import load_textures, SpriteCache, draw_grid, draw_cells, draw_timeline, timeline_tick
 
 # Load textures
-textures = {}
 if not os.path.exists("textures"):
     os.makedirs("textures")
-
-with open("textures/texture_names.txt") as f:
-    # Notation:
-    # tex_name file_name
-    for line in f.readlines():
-        line = line.split("#")[0]
-        if not line.strip(): continue
-        parts = line.strip().split()
-        tex_name, file_name = parts[0], parts[1]
-        textures[tex_name] = pygame.image.load(f"textures\\{file_name}")
-
-# Vector class
-class Vector:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-    def __add__(self, other):
-        return Vector(self[0] + other[0], self[1] + other[1])
-    
-    def __sub__(self, other):
-        return Vector(self[0] - other[0], self[1] - other[1])
-    
-    def __mul__(self, other):
-        return Vector(self[0] * other, self[1] * other)
-    
-    def __pow__(self, other):
-        return Vector(self[0] * other[0], self[1] * other[1])
-    
-    def rotcw(self):
-        return Vector(-self[1], self[0])
-    
-    def rotccw(self):
-        return Vector(self[1], -self[0])  
-    
-    def rot180(self):
-        return Vector(-self[0], -self[1])
-    
-    def tuple(self):
-        return (self.x, self.y)
-
-    def __getitem__(self, index):
-        return (self.x, self.y)[index]
-
-    def __str__(self):
-        return f"<X: {self.x}, Y: {self.y}>"
-    
-    def __eq__(self, other):
-        if not isinstance(other, Vector):
-            return NotImplemented
-        return self.x == other.x and self.y == other.y
-    
-    def __class_getitem__(cls, _):
-        return cls
-
-# Sample vectors
-UP = Vector(0, -1)
-DOWN = Vector(0, 1)
-LEFT = Vector(-1, 0)
-RIGHT = Vector(1, 0)
-
-# Grid class (immutable)
-class Grid:
-    range = ((-50, 50), (-50, 50))
-    cells = []
-    state_stack = []
-
-    def getCellAt(pos):
-        candidates = [c for c in Grid.cells if c.pos == pos]
-        if candidates: return candidates[0]
-        return None
-
-    def isInBounds(point):
-        x, y = point
-        (xmin, xmax), (ymin, ymax) = Grid.range
-        return (
-            (xmin is None or x >= xmin) and
-            (xmax is None or x <= xmax) and
-            (ymin is None or y >= ymin) and
-            (ymax is None or y <= ymax)
-        )
-    
-    def clear_all():
-        for c in Grid.cells:
-            c.destroy(silent = True)
-
-    def save_state():
-        saved = []
-        for c in Grid.cells:
-            saved.append({
-                "type": Cell.subclasses.index(c.__class__),
-                "x": c.pos.x,
-                "y": c.pos.y,
-                "dir": [RIGHT, DOWN, LEFT, UP].index(c.dir)
-            })
-        return saved
-    
-    def load_state(state):
-        Grid.clear_all()
-        for item in state:
-            cell_class = Cell.subclasses[item["type"]]
-            pos = Vector(item["x"], item["y"])
-            dir_vec = [RIGHT, DOWN, LEFT, UP][item["dir"]]
-            cell_class(pos, dir_vec)
-
-    def push_state():
-        Grid.state_stack.append(Grid.save_state())
-    
-    def pop_state():
-        Grid.load_state(Grid.state_stack.pop())
-
-# Helpers
-def rotate_by_dir(dir):
-    global RIGHT, LEFT, UP, DOWN
-    match dir:
-        case _ if dir == RIGHT:
-            return 0
-        case _ if dir == LEFT:
-            return 180
-        case _ if dir == UP:
-            return 90
-        case _ if dir == DOWN:
-            return 270
-        case _:
-            return 0
-
-def shortest_angle(a, b):
-    diff = (b - a + 180) % 360 - 180
-    return a + diff
-
-TICK_RATE = 10 # cells per second
-
-# Main cell class
-class Cell:
-    pos: Vector[int]
-    dir: Vector[int]
-    vel: Vector[int]
-    anim_from: Vector[int]
-    anim_to: Vector[int]
-    anim_t: float
-    render_rot: float
-    target_rot: float
-
-    max_priority = 0
-
-    def __init__(self, pos, dir):
-        self.pos = pos
-        self.dir = dir
-        self.vel = Vector(0, 0)
-        self.anim_from = pos
-        self.anim_to = pos
-        self.anim_t = 1.0
-        self.render_rot = rotate_by_dir(dir)
-        self.target_rot = self.render_rot
-        Grid.cells.append(self)
-    
-    subclasses = []
-    def __init_subclass__(cls):
-        Cell.subclasses.append(cls)
-        if Cell.max_priority < cls.get_priority(None):
-            Cell.max_priority = cls.get_priority(None)
-    
-    def shallow_copy(self):
-        print(self, "copied")
-        new = self.__class__(self.pos, self.dir)
-        new.vel = self.vel
-        new.anim_from = self.anim_from
-        new.anim_to = self.anim_to
-        new.anim_t = self.anim_t
-        new.render_rot = self.render_rot
-        new.target_rot = self.target_rot
-        return new
-    
-    def futurePos(self):
-        new = self.pos + self.vel
-        if Grid.getCellAt(new) is not None: return
-        if not Grid.isInBounds(new): return
-        return new
-
-    def move(self, vel = None):
-        vel = vel or self.vel
-        self.vel = Vector(0, 0)
-
-        if vel == Vector(0, 0): return
-        
-        self.finish_animation()
-        
-        self.vel = Vector(0, 0)
-        new = self.pos + vel
-        if (cell_in_front := Grid.getCellAt(new)) is not None:
-            cell_in_front.apply_force(vel, self)
-            if Grid.getCellAt(new) is not None: return
-            
-        if not Grid.isInBounds(new): return
-        
-        if self.anim_from == self.anim_to: self.anim_from = self.pos
-        self.anim_to = new
-        self.anim_rot_to = rotate_by_dir(self.dir)
-
-        self.anim_t = 0.0
-
-        self.pos = new
-    
-    def destroy(self, silent = False):
-        if not silent: print("Destroyed", self)
-        if self in Grid.cells: Grid.cells.remove(self)
-        del self
-    
-    def __str__(self):
-        return f"{self.get_label()} at {self.pos} facing {self.dir}"
-    
-    def can_move(self, force, visited=None):
-        if visited is None:
-            visited = set()
-
-        if id(self) in visited:
-            return False
-
-        visited.add(id(self))
-
-        next_pos = self.pos + force
-
-        if not Grid.isInBounds(next_pos):
-            return False
-
-        cell = Grid.getCellAt(next_pos)
-        if cell is None:
-            return True
-
-        return cell.can_move(force, visited)
-    
-    def rotate(self, new_dir):
-        self.dir = new_dir
-        self.target_rot = rotate_by_dir(new_dir)
-
-    def update_animation(self, dt):
-        # position animation
-        if self.anim_t < 1.0:
-            self.anim_t += TICK_RATE * dt
-            if self.anim_t > 1.0:
-                self.anim_t = 1.0
-
-        # rotation animation
-        ROTATE_SPEED = 200
-        diff = (self.target_rot - self.render_rot + 180) % 360 - 180
-        step = ROTATE_SPEED * dt * TICK_RATE
-
-        if abs(diff) <= step:
-            self.render_rot = self.target_rot
-        else:
-            self.render_rot += step if diff > 0 else -step
-    
-    def finish_animation(self):
-        if self.anim_t < 1.0:
-            t = self.anim_t
-            self.anim_from = Vector(
-                self.anim_from.x + (self.anim_to.x - self.anim_from.x) * t,
-                self.anim_from.y + (self.anim_to.y - self.anim_from.y) * t,
-            )
-
-        self.anim_to = self.anim_from
-        self.anim_t = 1.0
-    
-    def get_render_pos(self):
-        t = self.anim_t
-        return Vector(
-            self.anim_from.x + (self.anim_to.x - self.anim_from.x) * t,
-            self.anim_from.y + (self.anim_to.y - self.anim_from.y) * t,
-        )
-    
-    # These are all to be set by subclasses
-    def get_label(self): pass
-    def get_desc(self): pass
-    def get_image(self): pass
-    def get_priority(self): pass
-    def tick(self): pass
-    def apply_force(self, force, cell=None):
-        if force == Vector(0, 0):
-            return
-        if not self.can_move(force):
-            return
-        self.move(force)
-
-class Wall(Cell):
-    def get_label(self): return "Wall"
-    def get_desc(self): return "Cannot be moved"
-    def get_image(self): return "cell_wall"
-    def get_priority(self): return 0
-    def apply_force(self, force, cell=None): pass
-
-class Mover(Cell):
-    def get_label(self): return "Mover"
-    def get_desc(self): return "Moves forward over time"
-    def get_image(self): return "cell_mover"
-    def get_priority(self): return 3
-    def tick(self):
-        if (cellInFront := Grid.getCellAt(self.pos + self.dir)) is not None:
-            cellInFront.apply_force(self.dir, self)
-        self.vel += self.dir
-
-class Generator(Cell):
-    def get_label(self): return "Generator"
-    def get_desc(self): return "Generates the cell behind it in front of it"
-    def get_image(self): return "cell_generator"
-    def get_priority(self): return 1
-
-    def tick(self):
-        back_pos = self.pos - self.dir
-
-        source = Grid.getCellAt(back_pos)
-        if source is None:
-            return
-
-        new_cell = source.shallow_copy()
-        new_cell.pos = self.pos
-        new_cell.apply_force(self.dir)
-
-        if new_cell.pos == self.pos:
-            new_cell.destroy()
-
-class RotatorCW(Cell):
-    def get_label(self): return "Rotator (clockwise)"
-    def get_desc(self): return "Rotates adjacent cells clockwise 90 degrees"
-    def get_image(self): return "cell_rotatorcw"
-    def get_priority(self): return 2
-    def tick(self):
-        if (cellU := Grid.getCellAt(self.pos + UP)) is not None:
-            cellU.rotate(cellU.dir.rotcw())
-        if (cellD := Grid.getCellAt(self.pos + DOWN)) is not None:
-            cellD.rotate(cellD.dir.rotcw())
-        if (cellL := Grid.getCellAt(self.pos + LEFT)) is not None:
-            cellL.rotate(cellL.dir.rotcw())
-        if (cellR := Grid.getCellAt(self.pos + RIGHT)) is not None:
-            cellR.rotate(cellR.dir.rotcw())
-
-class RotatorCCW(Cell):
-    def get_label(self): return "Rotator (counter-clockwise)"
-    def get_desc(self): return "Rotates adjacent cells counter-clockwise 90 degrees"
-    def get_image(self): return "cell_rotatorccw"
-    def get_priority(self): return 2
-    def tick(self):
-        if (cellU := Grid.getCellAt(self.pos + UP)) is not None:
-            cellU.rotate(cellU.dir.rotccw())
-        if (cellD := Grid.getCellAt(self.pos + DOWN)) is not None:
-            cellD.rotate(cellD.dir.rotccw())
-        if (cellL := Grid.getCellAt(self.pos + LEFT)) is not None:
-            cellL.rotate(cellL.dir.rotccw())
-        if (cellR := Grid.getCellAt(self.pos + RIGHT)) is not None:
-            cellR.rotate(cellR.dir.rotccw())
-
-class Rotator180(Cell):
-    def get_label(self): return "Rotator (180)"
-    def get_desc(self): return "Rotates adjacent cells 180 degrees"
-    def get_image(self): return "cell_rotator180"
-    def get_priority(self): return 2
-    def tick(self):
-        if (cellU := Grid.getCellAt(self.pos + UP)) is not None:
-            cellU.rotate(cellU.dir.rot180())
-        if (cellD := Grid.getCellAt(self.pos + DOWN)) is not None:
-            cellD.rotate(cellD.dir.rot180())
-        if (cellL := Grid.getCellAt(self.pos + LEFT)) is not None:
-            cellL.rotate(cellL.dir.rot180())
-        if (cellR := Grid.getCellAt(self.pos + RIGHT)) is not None:
-            cellR.rotate(cellR.dir.rot180())
-
-class Push(Cell):
-    def get_label(self): return "Push"
-    def get_desc(self): return "Can be pushed by other cells"
-    def get_image(self): return "cell_push"
-    def get_priority(self): return 0
-
-class Slide(Cell):
-    def get_label(self): return "Slide"
-    def get_desc(self): return "Can be pushed only in the indicated direction"
-    def get_image(self): return "cell_slide"
-    def get_priority(self): return 0
-    def apply_force(self, force, cell=None):
-        if force == self.dir or force == self.dir.rot180():
-            super().apply_force(force, self)
-    
-class Enemy(Cell):
-    def get_label(self): return "Enemy"
-    def get_desc(self): return "Destroys any cell that moves into it, along with itself"
-    def get_image(self): return "cell_enemy"
-    def get_priority(self): return 0  
-    def apply_force(self, force, cell=None):
-        if cell is None: return
-        cell.destroy()
-        self.destroy()
-
-class Trash(Cell):
-    def get_label(self): return "Trash"
-    def get_desc(self): return "Destroys any cell that moves into it"
-    def get_image(self): return "cell_trash"
-    def get_priority(self): return 0
-    def apply_force(self, force, cell=None):
-        if cell is None:
-            return
-        cell.destroy()
+textures = load_textures("textures")
 
 # Main pygame loop
 pygame.init()
 screen = pygame.display.set_mode((800, 500))
 pygame.display.set_caption(f"Pyxell (v{VERSION})")
 clock = pygame.time.Clock()
+sprites = SpriteCache(textures)
+
+Grid.debug = "--debug" in sys.argv
+if "--unbounded" in sys.argv:
+    # No edges, and chunks keep the quiet parts of the world cheap
+    Grid.range = UNBOUNDED
+    Grid.set_chunked(True)
+engine = Engine()
 
 running = True
 sim_run = False
 sim_run_off_next_frame = False
 camera_zoom = 32
 camera_pos = (0, 0)
-placedir = Vector(1, 0)
+placedir = 0 # right, see cells.DIRECTIONS
 selected = None
-runtime = 0
+runtime = 0 # ticks owed, grows by the tick rate every second
+turbo = False
+turbo_rate = 1000 # ticks per second when fast-forwarding
 clicked_this_frame = False
 clicked_last_frame = False
+stroke = None # edit journal while the mouse is held down on the grid
+timeline = None # history since Play was pressed
 
 while running:
-    dt = clock.tick(60) / 1000.0
+    dt = clock.tick(FRAME_RATE) / 1000.0
 
     clicked_this_frame = pygame.mouse.get_pressed()[0]
 
@@ -444,9 +68,27 @@ while running:
             if event.key == pygame.K_SPACE:
                 sim_run = not sim_run
                 runtime = 1
-            if event.key == pygame.K_e: placedir = placedir.rotcw() 
-            if event.key == pygame.K_q: placedir = placedir.rotccw()
-            if event.key == pygame.K_r: Grid.clear_all()
+            if event.key == pygame.K_e: placedir = (placedir + 1) % 4
+            if event.key == pygame.K_q: placedir = (placedir + 3) % 4
+            if event.key == pygame.K_r:
+                edit = Grid.begin_edit()
+                Grid.clear_all()
+                Grid.end_edit(edit)
+            if event.key == pygame.K_z and not sim_run: Grid.undo()
+            if event.key == pygame.K_y and not sim_run: Grid.redo()
+            if event.key == pygame.K_F5:
+                levels.save(LEVEL_FILE)
+                print("Saved to", LEVEL_FILE)
+            if event.key == pygame.K_F9 and timeline is None and os.path.exists(LEVEL_FILE):
+                edit = Grid.begin_edit()
+                levels.load(LEVEL_FILE)
+                Grid.end_edit(edit)
+                print("Loaded", LEVEL_FILE)
+            if event.key == pygame.K_LEFT and timeline and not sim_run: timeline.step_back()
+            if event.key == pygame.K_RIGHT and timeline and not sim_run: timeline.seek(engine.ticks + 1)
+            if event.key == pygame.K_f: turbo = not turbo
+            if event.key == pygame.K_RIGHTBRACKET: turbo_rate *= 2
+            if event.key == pygame.K_LEFTBRACKET: turbo_rate = max(turbo_rate // 2, 1)
     
     keys = pygame.key.get_pressed()
     speed = 1/3
@@ -478,6 +120,7 @@ while running:
     controls = ["play", "step"]
     if sim_run:
         controls = ["pause", "stop"]
+    timeline_rect = pygame.Rect(controls_x + controls_spacing * 2, controls_y + 10, 240, 12)
 
     mouse_pos = pygame.mouse.get_pos()
     gui_click = False
@@ -507,7 +150,10 @@ while running:
                     controls_y <= mouse_pos[1] <= controls_y + controls_scale:
                 if not clicked_last_frame:
                     if c == "play":
-                        Grid.push_state()
+                        # Resuming after a pause keeps the same checkpoint and timeline
+                        if timeline is None:
+                            Grid.push_state()
+                            timeline = Timeline(engine)
                         sim_run = True
                         runtime = 1
                         print("Playing simulation")
@@ -518,7 +164,9 @@ while running:
                     elif c == "stop":
                         sim_run = False
                         runtime = 1
-                        Grid.pop_state()
+                        if timeline is not None:
+                            Grid.pop_state()
+                            timeline = None
                         print("Stopping simulation")
                     elif c == "step":
                         sim_run = True
@@ -527,8 +175,15 @@ while running:
                         print("Stepping simulation")
                 gui_click = True
 
-        # Edit grid state
+        # Scrub the timeline
+        if timeline and timeline_rect.collidepoint(mouse_pos):
+            timeline.seek(timeline_tick(timeline, timeline_rect, mouse_pos[0]))
+            gui_click = True
+
+        # Edit grid state, one undo step per stroke
         if not gui_click and not sim_run:
+            if stroke is None:
+                stroke = Grid.begin_edit()
             world_pos = Vector(
                 camera_pos[0] + (mouse_pos[0] - screen.get_width() / 2) / camera_zoom,
                 camera_pos[1] + (mouse_pos[1] - screen.get_height() / 2) / camera_zoom
@@ -542,97 +197,55 @@ while running:
             elif not selected and Grid.getCellAt(world_pos) is not None:
                 Grid.getCellAt(world_pos).destroy()
 
+    if not clicked_this_frame and stroke is not None:
+        Grid.end_edit(stroke)
+        stroke = None
+
     # Update
+    # Run every tick owed since the last frame, as long as they fit in the
+    # frame. Fast-forwarded ticks are not animated, cells just jump.
     if sim_run:
-        if runtime >= 1:
+        Grid.animate = not turbo
+        deadline = time.perf_counter() + TICK_BUDGET
+        # Ticks run outside Play can be undone like edits
+        edit = None if Grid.state_stack else Grid.begin_edit()
+        while runtime >= 1 and time.perf_counter() < deadline:
             runtime -= 1
-
-            # Sort by priority, then by direction and position
-            directions = [RIGHT, LEFT, UP, DOWN]
-            keys = [lambda c: -c.pos[0], lambda c: c.pos[0],
-                    lambda c: c.pos[1], lambda c: -c.pos[1]]
-
-            for priority in range(Cell.max_priority + 1):
-                tick_order = []
-
-                for direction, key in zip(directions, keys):
-                    matching = [
-                        c for c in Grid.cells
-                        if c.dir == direction and c.get_priority() == priority
-                    ]
-                    tick_order.extend(sorted(matching, key=key))
-                    
-                # One pass for ticking cells
-                for c in tick_order:
-                    print("Ticking", c)
-                    c.anim_from = c.pos
-                    c.tick()
-                # Another pass for moving cells
-                for c in tick_order:
-                    print("Moving", c)
-                    c.move()
+            if timeline:
+                timeline.step()
+            else:
+                engine.step()
+        if edit is not None:
+            Grid.end_edit(edit)
+        # Drop what did not fit rather than falling further behind
+        runtime = min(runtime, 1)
+        if turbo:
+            Grid.finish_animations()
 
     for cell in Grid.cells:
         cell.update_animation(dt)
     
     if sim_run:
-        runtime += dt * TICK_RATE
+        runtime += dt * (turbo_rate if turbo else TICK_RATE)
     else:
         runtime = 0
 
     # Draw
-    empty = textures["grid_blank"]
     screen.fill((0, 0, 0))
+    sprites.set_zoom(camera_zoom)
 
-    # Calculate visible grid bounds
-    cam_x, cam_y = camera_pos
-    grid_width = screen.get_width() / camera_zoom
-    grid_height = screen.get_height() / camera_zoom
-    min_x = int(cam_x - grid_width / 2) - 1
-    max_x = int(cam_x + grid_width / 2) + 1
-    min_y = int(cam_y - grid_height / 2) - 1
-    max_y = int(cam_y + grid_height / 2) + 1
-
-    # Draw grid
-    for x in range(min_x, max_x):
-        for y in range(min_y, max_y):
-            if not Grid.isInBounds(Vector(x, y)): continue
-            screen_x = (x - cam_x) * camera_zoom + screen.get_width() / 2
-            screen_y = (y - cam_y) * camera_zoom + screen.get_height() / 2
-            scaled = pygame.transform.scale(empty, (camera_zoom, camera_zoom))
-            screen.blit(scaled, (screen_x, screen_y))
-
-    # Draw cells
-    for x in range(min_x, max_x):
-        for y in range(min_y, max_y):
-            if not Grid.isInBounds(Vector(x, y)): continue
-            if cell := Grid.getCellAt(Vector(x, y)):
-                r = cell.get_render_pos()
-                rx, ry = r.x, r.y
-
-                screen_x = (rx - cam_x) * camera_zoom + screen.get_width() / 2
-                screen_y = (ry - cam_y) * camera_zoom + screen.get_height() / 2
-
-                screen_x += camera_zoom / 2
-                screen_y += camera_zoom / 2
-
-                image = textures[cell.get_image()]
-                scaled = pygame.transform.scale(image, (camera_zoom, camera_zoom))
-                rotated = pygame.transform.rotate(scaled, cell.render_rot)
-
-                rect = rotated.get_rect(center=(screen_x, screen_y))
-                screen.blit(rotated, rect)
+    # Draw grid and the cells in view
+    draw_grid(screen, sprites, camera_pos, camera_zoom)
+    draw_cells(screen, sprites, camera_pos, camera_zoom)
     
     # Draw cell palette
-    none = textures["gui_none"]
     select_offset = 10
 
     # Draw none icon
     y = palette_y
     if selected == None:
         y -= select_offset
-    scaled = pygame.transform.scale(none, (palette_scale, palette_scale))
-    screen.blit(scaled, (palette_x, y))
+    screen.blit(sprites.get("gui_none", palette_scale), (palette_x, y))
     
     # Draw the rest of the cell palette
     for i, cell_class in enumerate(Cell.subclasses):
@@ -644,22 +257,20 @@ while running:
             y -= select_offset
         
         dummy_cell = cell_class(Vector(0, 0), placedir)
-        image = textures[dummy_cell.get_image()]
-        scaled = pygame.transform.scale(image, (palette_scale, palette_scale))
-        rotated = pygame.transform.rotate(scaled, rotate_by_dir(dummy_cell.dir))
-        screen.blit(rotated, (x, y))
-        dummy_cell.destroy(silent = True)
+        sprite = sprites.get(dummy_cell.get_image(), palette_scale, DIR_ANGLES[dummy_cell.dir])
+        screen.blit(sprite, (x, y))
+        dummy_cell.destroy()
     
     # Draw playback controls
     for i, c in enumerate(controls):
         x = controls_x + controls_spacing * i
-        image = textures["gui_" + c]
-        scaled = pygame.transform.scale(image, (controls_scale, controls_scale))
-        screen.blit(scaled, (x, controls_y))
+        screen.blit(sprites.get("gui_" + c, controls_scale), (x, controls_y))
+    if timeline:
+        draw_timeline(screen, timeline, timeline_rect)
     
     clicked_last_frame = clicked_this_frame
     
+    pygame.display.set_caption(f"Pyxell (v{VERSION})" + (f" - turbo {turbo_rate} ticks/s" if turbo else ""))
     pygame.display.flip()
-    clock.tick(60)
 
 pygame.quit()
\ No newline at end of file
@@ -0,0 +1,134 @@
+"""
+The tick rules written as plainly as possible, for checking faster engines.
+
+Every lookup scans the whole cell list, pushes recurse cell by cell, and the
+tick order is sorted from scratch every phase, the way Pyxell first did it.
+Far too slow to play on, but easy to check by reading. fuzz.py compares
+Engine (and the others) against it.
+"""
+
+from cells import Cell, Wall, Mover, Generator, RotatorCW, RotatorCCW, Rotator180, Slide, Enemy, Trash
+
+DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)] # by Cell.dir
+TICK_DIRECTIONS = [0, 2, 3, 1] # right, left, up, down
+TURNS = {RotatorCW: 1, RotatorCCW: 3, Rotator180: 2} # quarter turns clockwise
+ZERO = (0, 0)
+
+def add(a, b):
+    return (a[0] + b[0], a[1] + b[1])
+
+class RefCell:
+    def __init__(self, kind, pos, dir):
+        self.kind = kind # a Cell subclass, only used for its type and priority
+        self.pos = pos
+        self.dir = dir
+        self.vel = ZERO
+
+class ReferenceGrid:
+    def __init__(self, state, range):
+        self.range = range
+        self.cells = [
+            RefCell(Cell.subclasses[item["type"]], (item["x"], item["y"]), item["dir"])
+            for item in state
+        ]
+
+    def save_state(self):
+        return [
+            {"type": Cell.subclasses.index(c.kind), "x": c.pos[0], "y": c.pos[1], "dir": c.dir}
+            for c in self.cells
+        ]
+
+    def cell_at(self, pos):
+        # The first cell on a tile wins
+        for c in self.cells:
+            if c.pos == pos:
+                return c
+        return None
+
+    def in_bounds(self, pos):
+        (xmin, xmax), (ymin, ymax) = self.range
+        return (
+            (xmin is None or pos[0] >= xmin) and
+            (xmax is None or pos[0] <= xmax) and
+            (ymin is None or pos[1] >= ymin) and
+            (ymax is None or pos[1] <= ymax)
+        )
+
+    def destroy(self, cell):
+        if cell in self.cells:
+            self.cells.remove(cell)
+
+    def can_move(self, cell, force, visited):
+        # Only space and bounds count here, what is in the way reacts in move()
+        if id(cell) in visited:
+            return False
+        visited.add(id(cell))
+        next_pos = add(cell.pos, force)
+        if not self.in_bounds(next_pos):
+            return False
+        next_cell = self.cell_at(next_pos)
+        return next_cell is None or self.can_move(next_cell, force, visited)
+
+    def apply_force(self, cell, force, pusher = None):
+        kind = cell.kind
+        if kind is Wall:
+            return
+        if kind is Enemy or kind is Trash:
+            if pusher is None: return
+            self.destroy(pusher)
+            if kind is Enemy: self.destroy(cell)
+            return
+        if kind is Slide:
+            opposite = DIRECTIONS[(cell.dir + 2) % 4]
+            if force != DIRECTIONS[cell.dir] and force != opposite: return
+        if force == ZERO: return
+        if not self.can_move(cell, force, set()): return
+        self.move(cell, force)
+
+    def move(self, cell, vel = None):
+        if vel is None:
+            vel = cell.vel
+        cell.vel = ZERO
+        if vel == ZERO: return
+
+        new = add(cell.pos, vel)
+        if (in_front := self.cell_at(new)) is not None:
+            self.apply_force(in_front, vel, cell)
+            if self.cell_at(new) is not None: return
+        if not self.in_bounds(new): return
+        cell.pos = new
+
+    def tick_cell(self, cell):
+        kind = cell.kind
+        dir = DIRECTIONS[cell.dir]
+        if kind is Mover:
+            if (in_front := self.cell_at(add(cell.pos, dir))) is not None:
+                self.apply_force(in_front, dir, cell)
+            cell.vel = add(cell.vel, dir)
+        elif kind is Generator:
+            source = self.cell_at((cell.pos[0] - dir[0], cell.pos[1] - dir[1]))
+            if source is None: return
+            copy = RefCell(source.kind, cell.pos, source.dir)
+            copy.vel = source.vel
+            self.cells.append(copy)
+            self.apply_force(copy, dir)
+            if copy.pos == cell.pos:
+                self.destroy(copy)
+        elif kind in TURNS:
+            for offset in (DIRECTIONS[3], DIRECTIONS[1], DIRECTIONS[2], DIRECTIONS[0]):
+                if (neighbour := self.cell_at(add(cell.pos, offset))) is not None:
+                    neighbour.dir = (neighbour.dir + TURNS[kind]) % 4
+
+    def tick(self):
+        # By priority, then by direction, front-most first. Cells destroyed
+        # during a phase still get their turn in it.
+        for priority in range(Cell.max_priority + 1):
+            order = []
+            for d in TICK_DIRECTIONS:
+                dx, dy = DIRECTIONS[d]
+                matching = [c for c in self.cells if c.dir == d and c.kind.get_priority(None) == priority]
+                order.extend(sorted(matching, key = lambda c: -(c.pos[0] * dx + c.pos[1] * dy)))
+            for c in order:
+                self.tick_cell(c)
+            for c in order:
+                self.move(c)
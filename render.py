@@ -0,0 +1,155 @@
+"""
+Drawing helpers for the pygame window.
+
+Scaling and rotating a texture is much slower than blitting it, so sprites are
+made once per (texture, size, angle) and kept until the zoom changes.
+"""
+
+import math
+import os
+import pygame
+from collections import OrderedDict
+
+from cells import Grid
+
+ANGLE_STEP = 15 # in-between animation angles are rounded to this many degrees
+MAX_TWEENS = 256 # in-between sprites kept at once
+ANIM_MARGIN = 1 # tiles a cell can be drawn away from its pos
+
+def load_textures(folder = "textures"):
+    # tex_name -> surface, from the folder's texture_names.txt. File paths
+    # there use backslashes, so they are split up for other platforms.
+    textures = {}
+    with open(os.path.join(folder, "texture_names.txt")) as f:
+        # Notation:
+        # tex_name file_name
+        for line in f.readlines():
+            line = line.split("#")[0]
+            if not line.strip(): continue
+            parts = line.strip().split()
+            tex_name, file_name = parts[0], parts[1]
+            textures[tex_name] = pygame.image.load(os.path.join(folder, *file_name.split("\\")))
+    return textures
+
+class SpriteCache:
+    def __init__(self, textures):
+        self.textures = textures
+        self.converted = {} # name -> texture in the display's pixel format
+        self.sprites = {} # (name, size, angle) -> surface, cardinal angles only
+        self.tweens = OrderedDict() # the same for other angles, least recently used first
+        self.backgrounds = {}
+        self.zoom = None
+
+    def set_zoom(self, zoom):
+        # Everything drawn at the old zoom is useless now
+        if zoom == self.zoom: return
+        self.zoom = zoom
+        self.clear()
+
+    def clear(self):
+        self.sprites.clear()
+        self.tweens.clear()
+        self.backgrounds.clear()
+
+    def texture(self, name):
+        # convert_alpha needs a display, so textures are converted on first use
+        if name not in self.converted:
+            self.converted[name] = self.textures[name].convert_alpha()
+        return self.converted[name]
+
+    def get(self, name, size, angle = 0):
+        angle = round(angle / ANGLE_STEP) * ANGLE_STEP % 360
+        key = (name, size, angle)
+
+        if angle % 90 == 0:
+            if key not in self.sprites:
+                self.sprites[key] = self.make(name, size, angle)
+            return self.sprites[key]
+
+        if key in self.tweens:
+            self.tweens.move_to_end(key)
+            return self.tweens[key]
+        sprite = self.tweens[key] = self.make(name, size, angle)
+        if len(self.tweens) > MAX_TWEENS:
+            self.tweens.popitem(last = False)
+        return sprite
+
+    def make(self, name, size, angle):
+        sprite = pygame.transform.scale(self.texture(name), (size, size))
+        if angle:
+            sprite = pygame.transform.rotate(sprite, angle)
+        return sprite
+
+    def background(self, name, size, cols, rows):
+        # One surface holding cols x rows copies of a tile
+        key = (name, size, cols, rows)
+        if key not in self.backgrounds:
+            tile = self.get(name, size)
+            surface = pygame.Surface((cols * size, rows * size)).convert()
+            for x in range(cols):
+                for y in range(rows):
+                    surface.blit(tile, (x * size, y * size))
+            self.backgrounds[key] = surface
+        return self.backgrounds[key]
+
+def to_screen(screen, camera_pos, zoom, x, y):
+    return (
+        (x - camera_pos[0]) * zoom + screen.get_width() / 2,
+        (y - camera_pos[1]) * zoom + screen.get_height() / 2
+    )
+
+def draw_grid(screen, sprites, camera_pos, zoom):
+    w, h = screen.get_size()
+
+    # Top left tile on screen, and the tiled surface that covers the rest
+    x0 = math.floor(camera_pos[0] - w / 2 / zoom)
+    y0 = math.floor(camera_pos[1] - h / 2 / zoom)
+    cols, rows = w // zoom + 2, h // zoom + 2
+    background = sprites.background("grid_blank", zoom, cols, rows)
+
+    # Only the part inside the grid range is drawn
+    (xmin, xmax), (ymin, ymax) = Grid.range
+    left, top = to_screen(screen, camera_pos, zoom,
+        x0 if xmin is None else xmin, y0 if ymin is None else ymin)
+    right, bottom = to_screen(screen, camera_pos, zoom,
+        x0 + cols if xmax is None else xmax + 1, y0 + rows if ymax is None else ymax + 1)
+
+    left, top, right, bottom = round(left), round(top), round(right), round(bottom)
+    if right <= left or bottom <= top: return
+    screen.set_clip(pygame.Rect(left, top, right - left, bottom - top).clip(screen.get_rect()))
+    screen.blit(background, to_screen(screen, camera_pos, zoom, x0, y0))
+    screen.set_clip(None)
+
+def draw_cells(screen, sprites, camera_pos, zoom):
+    w, h = screen.get_size()
+    left = camera_pos[0] - w / 2 / zoom
+    top = camera_pos[1] - h / 2 / zoom
+    right = left + w / zoom
+    bottom = top + h / zoom
+
+    # A cell is drawn up to a tile away from its pos while it animates, so
+    # look one tile further out and cull on where it is drawn instead
+    margin = ANIM_MARGIN
+    for cell in Grid.cells_in(
+        math.floor(left) - margin, math.floor(right) + margin,
+        math.floor(top) - margin, math.floor(bottom) + margin
+    ):
+        r = cell.get_render_pos()
+        if r.x + 1 < left or r.x > right or r.y + 1 < top or r.y > bottom: continue
+        center = to_screen(screen, camera_pos, zoom, r.x + 0.5, r.y + 0.5)
+        sprite = sprites.get(cell.get_image(), zoom, cell.render_rot)
+        screen.blit(sprite, sprite.get_rect(center = center))
+
+def draw_timeline(screen, timeline, rect):
+    # From the oldest tick that can still be reached to the last one simulated
+    start, end = timeline.earliest(), timeline.end
+    pygame.draw.rect(screen, (60, 60, 60), rect)
+    if end > start:
+        done = rect.copy()
+        done.width = round(rect.width * (timeline.engine.ticks - start) / (end - start))
+        pygame.draw.rect(screen, (200, 200, 200), done)
+
+def timeline_tick(timeline, rect, x):
+    # The tick under screen position x on the bar
+    start, end = timeline.earliest(), timeline.end
+    return start + round((end - start) * min(max((x - rect.x) / rect.width, 0), 1))
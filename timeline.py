@@ -0,0 +1,105 @@
+"""
+Seekable history of a running simulation.
+
+A packed snapshot of the grid is kept every `interval` ticks, and a journal
+of the cells each tick changed for the last `interval` ticks. Going back a few
+ticks reverts those journals; going further loads the nearest keyframe and
+replays the ticks after it.
+"""
+
+from bisect import bisect_right, insort
+from collections import deque
+
+from cells import Grid
+
+JOURNAL_ENTRY_BYTES = 200 # rough size of one journal entry, for the memory budget
+
+class Timeline:
+    def __init__(self, engine, interval = 50, budget = 64 * 2**20):
+        self.engine = engine
+        self.interval = interval
+        self.budget = budget # bytes for keyframes and journals together
+        self.keyframe_ticks = [] # sorted
+        self.keyframes = {} # tick -> Grid.snapshot()
+        self.deltas = deque() # journals of the ticks up to engine.ticks, oldest first
+        self.delta_bytes = 0
+        self.keyframe_bytes = 0
+        self.end = engine.ticks # last tick simulated
+        self.keyframe()
+
+    def earliest(self):
+        # Older ticks went with their keyframes
+        return self.keyframe_ticks[0]
+
+    def keyframe(self):
+        tick = self.engine.ticks
+        if tick not in self.keyframes:
+            insort(self.keyframe_ticks, tick)
+        else:
+            self.keyframe_bytes -= len(self.keyframes[tick])
+        self.keyframes[tick] = Grid.snapshot()
+        self.keyframe_bytes += len(self.keyframes[tick])
+
+    def truncate(self):
+        # The grid was edited, so nothing recorded from here on holds anymore
+        tick = self.engine.ticks
+        while self.keyframe_ticks[-1] > tick:
+            self.keyframe_bytes -= len(self.keyframes.pop(self.keyframe_ticks.pop()))
+        self.clear_deltas()
+        self.end = tick
+        self.keyframe()
+
+    def clear_deltas(self):
+        self.deltas.clear()
+        self.delta_bytes = 0
+
+    def step(self):
+        if Grid.changed(Grid.touched):
+            self.truncate()
+
+        journal = Grid.open_journal()
+        self.engine.step()
+        self.deltas.append(Grid.close_journal(journal))
+        self.delta_bytes += len(journal) * JOURNAL_ENTRY_BYTES
+
+        tick = self.engine.ticks
+        self.end = max(self.end, tick)
+        if tick % self.interval == 0 and tick not in self.keyframes:
+            self.keyframe()
+        # Past one interval back, loading a keyframe is cheap enough
+        if len(self.deltas) > self.interval:
+            self.delta_bytes -= len(self.deltas.popleft()) * JOURNAL_ENTRY_BYTES
+        self.trim()
+
+    def trim(self):
+        # Oldest keyframes go first, but the newest one always stays
+        while self.keyframe_bytes + self.delta_bytes > self.budget and len(self.keyframe_ticks) > 1:
+            self.keyframe_bytes -= len(self.keyframes.pop(self.keyframe_ticks.pop(0)))
+        while self.keyframe_bytes + self.delta_bytes > self.budget and self.deltas:
+            self.delta_bytes -= len(self.deltas.popleft()) * JOURNAL_ENTRY_BYTES
+
+    def step_back(self):
+        self.seek(self.engine.ticks - 1)
+
+    def seek(self, tick):
+        tick = max(tick, self.earliest())
+        engine = self.engine
+
+        if engine.ticks - len(self.deltas) <= tick < engine.ticks:
+            # Close enough to revert tick by tick
+            while engine.ticks > tick:
+                journal = self.deltas.pop()
+                self.delta_bytes -= len(journal) * JOURNAL_ENTRY_BYTES
+                Grid.revert(journal)
+                engine.ticks -= 1
+            engine.forget_edits()
+            return
+
+        base = self.keyframe_ticks[bisect_right(self.keyframe_ticks, tick) - 1]
+        if not engine.ticks <= tick or base > engine.ticks:
+            # Journals refer to the cells being replaced, so they go too
+            self.clear_deltas()
+            engine.load_snapshot(self.keyframes[base])
+            engine.ticks = base
+        while engine.ticks < tick:
+            self.step()
@@ -0,0 +1,259 @@
+"""
+Dense NumPy version of the grid for very large boards.
+
+Only cells with simple rules are supported: Wall, Push, Slide, Mover and the
+three rotators. A tick is worked out a whole row or column at a time instead
+of cell by cell, and gives exactly the same grid as Engine.
+"""
+
+import numpy as np
+
+from cells import Grid, Cell, Wall, Mover, RotatorCW, RotatorCCW, Rotator180, Push, Slide
+from engine import Runner, CycleCache
+
+EMPTY = -1
+
+# Direction indices, as used by Grid.save_state
+RIGHT, DOWN, LEFT, UP = range(4)
+TICK_DIRECTIONS = [RIGHT, LEFT, UP, DOWN]
+
+SIMPLE_TYPES = [Wall, Push, Slide, Mover, RotatorCW, RotatorCCW, Rotator180]
+ROTATIONS = {RotatorCW: 1, RotatorCCW: -1, Rotator180: 2} # quarter turns clockwise
+
+WALL = Cell.subclasses.index(Wall)
+SLIDE = Cell.subclasses.index(Slide)
+MOVER = Cell.subclasses.index(Mover)
+
+def line_view(arr, dir):
+    # Each row of the view is one line of tiles, with the index growing towards dir
+    if dir == RIGHT: return arr
+    if dir == LEFT: return arr[:, ::-1]
+    if dir == DOWN: return arr.T
+    return arr.T[:, ::-1]
+
+def accepts(type, cell_dir, dir):
+    # Whether a cell gives way when pushed along dir
+    return (type != EMPTY) & (type != WALL) & ~((type == SLIDE) & (cell_dir % 2 != dir % 2))
+
+class ArrayGrid:
+    def __init__(self, range = None):
+        (xmin, xmax), (ymin, ymax) = range or Grid.range
+        if None in (xmin, xmax, ymin, ymax):
+            raise ValueError("ArrayGrid needs a bounded grid range")
+
+        self.origin = (xmin, ymin)
+        shape = (ymax - ymin + 1, xmax - xmin + 1)
+        self.type = np.full(shape, EMPTY, dtype = np.int8) # index into Cell.subclasses
+        self.dir = np.zeros(shape, dtype = np.int8)
+        self.serial = np.zeros(shape, dtype = np.int64) # creation order, like Cell.serial
+
+    def load_state(self, state):
+        types = np.array([item["type"] for item in state], dtype = np.int64)
+        xs = np.array([item["x"] for item in state], dtype = np.int64) - self.origin[0]
+        ys = np.array([item["y"] for item in state], dtype = np.int64) - self.origin[1]
+        dirs = np.array([item["dir"] for item in state], dtype = np.int8)
+
+        for t in np.unique(types):
+            if Cell.subclasses[t] not in SIMPLE_TYPES:
+                raise ValueError(f"{Cell.subclasses[t].__name__} cells are not supported by ArrayGrid")
+        h, w = self.type.shape
+        if len(state) and (xs.min() < 0 or ys.min() < 0 or xs.max() >= w or ys.max() >= h):
+            raise ValueError("Level has cells outside the grid range")
+        if len(np.unique(ys * w + xs)) != len(state):
+            raise ValueError("Level has more than one cell on a tile")
+
+        self.type.fill(EMPTY)
+        self.type[ys, xs] = types
+        self.dir[ys, xs] = dirs
+        self.serial[ys, xs] = np.arange(len(state))
+
+    def save_state(self):
+        # Same order as Grid.save_state: oldest cell first
+        ys, xs = np.nonzero(self.type != EMPTY)
+        order = np.argsort(self.serial[ys, xs], kind = "stable")
+        ys, xs = ys[order], xs[order]
+        types, dirs = self.type[ys, xs], self.dir[ys, xs]
+        x0, y0 = self.origin
+        return [
+            {"type": int(t), "x": int(x) + x0, "y": int(y) + y0, "dir": int(d)}
+            for t, x, y, d in zip(types, xs, ys, dirs)
+        ]
+
+    def snapshot(self):
+        # Same packing as cells.pack_state(self.save_state())
+        ys, xs = np.nonzero(self.type != EMPTY)
+        order = np.argsort(self.serial[ys, xs], kind = "stable")
+        ys, xs = ys[order], xs[order]
+        x0, y0 = self.origin
+        return np.stack([self.type[ys, xs], xs + x0, ys + y0, self.dir[ys, xs]], axis = 1).astype(np.int32).tobytes()
+
+    def load_snapshot(self, packed):
+        types, xs, ys, dirs = np.frombuffer(packed, dtype = np.int32).reshape(-1, 4).T
+        self.load_state([
+            {"type": int(t), "x": int(x), "y": int(y), "dir": int(d)}
+            for t, x, y, d in zip(types, xs, ys, dirs)
+        ])
+
+class ArrayEngine(Runner):
+    def __init__(self, grid, cycle_cache = 0):
+        self.grid = grid
+        self.ticks = 0
+        self.quiescent = False # the last tick changed nothing
+        self.period = None # length of the last cycle found by run()
+        self.cycles = CycleCache(cycle_cache) if cycle_cache else None
+
+    def save_state(self):
+        return self.grid.save_state()
+
+    def load_state(self, state):
+        self.grid.load_state(state)
+
+    def snapshot(self):
+        return self.grid.snapshot()
+
+    def load_snapshot(self, packed):
+        self.grid.load_snapshot(packed)
+
+    def tick(self):
+        g = self.grid
+        before = (g.type.copy(), g.dir.copy())
+
+        # Priorities 0 and 1 do nothing for the supported cells, rotators are 2
+        self.rotate()
+
+        # Movers are priority 3. Engine snapshots their order when the phase
+        # starts, so remember where each one stood along its own direction.
+        self.armed = np.zeros(g.type.shape, dtype = bool) # Mover.vel != 0
+        self.snap = np.zeros(g.type.shape, dtype = np.int64)
+        movers = g.type == MOVER
+        for dir in TICK_DIRECTIONS:
+            mask = line_view(movers & (g.dir == dir), dir)
+            line_view(self.snap, dir)[mask] = np.nonzero(mask)[1]
+
+        for dir in TICK_DIRECTIONS:
+            self.push_lines(dir, move = False)
+        for dir in TICK_DIRECTIONS:
+            self.push_lines(dir, move = True)
+
+        self.ticks += 1
+        self.quiescent = np.array_equal(before[0], g.type) and np.array_equal(before[1], g.dir)
+
+    def rotate(self):
+        g = self.grid
+        turn = np.zeros(g.type.shape, dtype = np.int8)
+        for cell_class, amount in ROTATIONS.items():
+            r = (g.type == Cell.subclasses.index(cell_class)).astype(np.int8) * amount
+            turn[1:, :] += r[:-1, :]
+            turn[:-1, :] += r[1:, :]
+            turn[:, 1:] += r[:, :-1]
+            turn[:, :-1] += r[:, 1:]
+        occupied = g.type != EMPTY
+        g.dir[occupied] = (g.dir[occupied] + turn[occupied]) % 4
+
+    def lines(self, dir):
+        g = self.grid
+        return [line_view(a, dir) for a in (g.type, g.dir, g.serial, self.armed, self.snap)]
+
+    def push_lines(self, dir, move):
+        # Every mover facing dir either ticks (pushes what is in front of it) or
+        # moves (pushes what is in front, then steps forward). Lines never affect
+        # each other here, so they are all worked out at once.
+        arrays = self.lines(dir)
+        t, dirs, serial, armed, snap = arrays
+        n = t.shape[1]
+
+        pushers = (t == MOVER) & (dirs == dir)
+        if move:
+            pushers &= armed
+        if not pushers.any():
+            return
+
+        # Within a line, Engine pushes front-most first by where movers stood at
+        # the start of the phase. Lines where that no longer matches the current
+        # order are rare and get replayed one push at a time.
+        li, j = np.nonzero(pushers)
+        same_line = li[1:] == li[:-1]
+        s, ser = snap[li, j], serial[li, j]
+        in_order = (s[1:] > s[:-1]) | ((s[1:] == s[:-1]) & (ser[1:] < ser[:-1]))
+        slow_lines = np.unique(li[1:][same_line & ~in_order])
+        pushers[slow_lines] = False
+
+        occupied = t != EMPTY
+        cols = np.arange(n, dtype = np.int32)
+
+        # First tile strictly ahead that is empty (end) or empty / refuses the push (stop)
+        end = self.first_ahead(np.where(occupied, n, cols))
+        stop = self.first_ahead(np.where(accepts(t, dirs, dir), n, cols))
+
+        # A pusher wins when everything up to the first gap gives way. Winners are
+        # always the front-most pushers of their run of cells.
+        win = pushers & (stop == end) & (end < n)
+        # Losers still call move() on what they reach, unless the run hits the edge
+        lose = pushers & ~win & (end < n)
+
+        # Cells ahead of a winner (and the winner itself when moving) up to the gap
+        reach = np.maximum.accumulate(np.where(win, end, -1), axis = 1)
+        if not move:
+            reach = self.shift_forward(reach)
+        shifted = occupied & (cols < reach)
+
+        touched = self.shift_forward(np.maximum.accumulate(np.where(lose, stop, -1), axis = 1))
+
+        armed[pushers] = not move
+        armed[shifted | (cols < touched)] = False
+
+        src = np.nonzero(shifted)
+        dst = (src[0], src[1] + 1)
+        vacated = shifted.copy()
+        vacated[:, 1:] &= ~shifted[:, :-1]
+        for a in arrays:
+            a[dst] = a[src]
+        t[vacated] = EMPTY
+
+        for line in slow_lines:
+            self.push_line_slowly(dir, [a[line] for a in arrays], move)
+
+    def first_ahead(self, marks):
+        # marks holds a tile's own index where it counts, n elsewhere
+        at_or_after = np.minimum.accumulate(marks[:, ::-1], axis = 1)[:, ::-1]
+        ahead = np.empty_like(at_or_after)
+        ahead[:, :-1] = at_or_after[:, 1:]
+        ahead[:, -1] = marks.shape[1]
+        return ahead
+
+    def shift_forward(self, values):
+        # What the tile just behind each tile sees, -1 at the start of a line
+        shifted = np.empty_like(values)
+        shifted[:, 1:] = values[:, :-1]
+        shifted[:, 0] = -1
+        return shifted
+
+    def push_line_slowly(self, dir, line, move):
+        t, dirs, serial, armed, snap = line
+        n = len(t)
+
+        pushers = np.flatnonzero((t == MOVER) & (dirs == dir))
+        order = sorted(pushers, key = lambda j: (-snap[j], serial[j]))
+        for ser in [serial[j] for j in order]:
+            j = np.flatnonzero((t != EMPTY) & (serial == ser))[0]
+            if move:
+                if not armed[j]: continue
+                armed[j] = False
+
+            front = j + 1
+            end = front
+            while end < n and t[end] != EMPTY:
+                end += 1
+            if end < n:
+                blocked = np.flatnonzero(~accepts(t[front:end], dirs[front:end], dir))
+                if len(blocked):
+                    armed[front:front + blocked[0]] = False
+                else:
+                    first = j if move else front
+                    for a in line:
+                        a[first + 1:end + 1] = a[first:end].copy()
+                    armed[first + 1:end + 1] = False
+                    t[first] = EMPTY
+
+            if not move:
+                armed[j] = True